@@ -0,0 +1,45 @@
+import os
+import subprocess
+import sys
+import typing as t
+from pathlib import Path
+
+ENTRY_POINT = "obsidian_github_formatter.repair_wikilinks_hook"
+# imported on first use only, a run that doesn't need them shouldn't pay for them
+DEFERRED_MODULES = (
+    "colorama",
+    "concurrent.futures.process",
+    "configparser",
+    "cProfile",
+    "dacite",
+    "difflib",
+    "obsidian_github_formatter.server",
+    "shutil",
+    "socketserver",
+    "yaml",
+)
+
+
+def measure_import(module: str = ENTRY_POINT) -> t.Tuple[float, t.List[str]]:
+    # A fresh interpreter reports, via `-X importtime`, the cumulative seconds of importing the module
+    # and every module imported on the way.
+    environment = dict(os.environ, PYTHONPATH=str(Path(__file__).parent.parent / "src"))
+    completed = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        check=True,
+        capture_output=True,
+        text=True,
+        env=environment,
+    )
+    cumulative = None
+    imported = []
+    for line in completed.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line or "cumulative" in line:
+            continue
+        _, microseconds, name = line.split("|")
+        imported.append(name.strip())
+        if name.strip() == module:
+            cumulative = int(microseconds) / 10**6
+    if cumulative is None:
+        raise RuntimeError(f"No import time reported for {module}")
+    return cumulative, imported
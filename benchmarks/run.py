@@ -0,0 +1,245 @@
+#!/usr/bin/env python
+import contextlib
+import dataclasses
+import io
+import json
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import typing as t
+from pathlib import Path
+
+import click
+
+from obsidian_github_formatter.cache import Cache
+from obsidian_github_formatter.files import (
+    expand_dir,
+    read_file,
+)
+from obsidian_github_formatter.index import (
+    build_file_map,
+    build_index,
+    render_index,
+)
+from obsidian_github_formatter.links import repair_links
+from obsidian_github_formatter.repair_wikilinks_hook import main as repair_wikilinks_main
+
+from .imports import (
+    DEFERRED_MODULES,
+    measure_import,
+)
+from .vault import (
+    VaultSpec,
+    generate_vault,
+    settle_mtimes,
+)
+
+_RESULTS_VERSION = 1
+
+Timings = t.List[float]
+
+
+def _measure(function: t.Callable[[], t.Any]) -> float:
+    started_at = time.perf_counter()
+    function()
+    return time.perf_counter() - started_at
+
+
+def bench_build_index(vault_root: Path, repeat: int) -> Timings:
+    return [
+        _measure(lambda: Cache(vault_root=vault_root, use_cache=False).get_value(build_index)) for _ in range(repeat)
+    ]
+
+
+def bench_build_index_cached(vault_root: Path, repeat: int) -> Timings:
+    Cache(vault_root=vault_root, use_cache=True).get_value(build_index)
+    # creating the cache directory touched the vault root, the snapshot is taken again once it's settled
+    settle_mtimes(vault_root)
+    Cache(vault_root=vault_root, use_cache=True).get_value(build_index)
+    timings = [
+        _measure(lambda: Cache(vault_root=vault_root, use_cache=True).get_value(build_index)) for _ in range(repeat)
+    ]
+    shutil.rmtree(vault_root / ".ogf-cache")
+    return timings
+
+
+def bench_render_index(vault_root: Path, repeat: int) -> Timings:
+    index = Cache(vault_root=vault_root, use_cache=False).get_value(build_index)
+    return [_measure(lambda: render_index(index)) for _ in range(repeat)]
+
+
+def bench_repair_links(vault_root: Path, repeat: int) -> Timings:
+    notes = [(path, read_file(path)) for path in expand_dir(vault_root)]
+    file_map = Cache(vault_root=vault_root, use_cache=False).get_value(build_file_map)
+
+    def run() -> None:
+        # a dry run never autogenerates files, so every round sees the same vault
+        cache = Cache(vault_root=vault_root, dry_run=True, make_backups=False, build_file_map=file_map)
+        for _, text in notes:
+            repair_links(text, cache)
+
+    return [_measure(run) for _ in range(repeat)]
+
+
+def bench_main(vault_root: Path, repeat: int) -> Timings:
+    timings = []
+    for _ in range(repeat):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            # every round modifies the notes, so it gets a fresh copy of the whole repository
+            repo_root = Path(temp_dir) / "repo"
+            shutil.copytree(vault_root.parent, repo_root)
+            copy_root = str(repo_root / vault_root.name)
+            arguments = ["--no-cache", "--root", copy_root, copy_root]
+            with contextlib.redirect_stdout(io.StringIO()):
+                timings.append(_measure(lambda: repair_wikilinks_main.main(arguments, standalone_mode=False)))
+    return timings
+
+
+def bench_import(_: Path, repeat: int) -> Timings:
+    # the first import compiles the bytecode, which is not what a hook run pays for
+    measure_import()
+    return [measure_import()[0] for _ in range(repeat)]
+
+
+BENCHMARKS: t.Dict[str, t.Callable[[Path, int], Timings]] = {
+    "build_index": bench_build_index,
+    "build_index_cached": bench_build_index_cached,
+    "render_index": bench_render_index,
+    "repair_links": bench_repair_links,
+    "main": bench_main,
+    "import": bench_import,
+}
+
+
+def _get_commit() -> t.Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"], check=True, capture_output=True, text=True, cwd=Path(__file__).parent
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_benchmarks(vault_root: Path, spec: VaultSpec, names: t.Iterable[str], repeat: int) -> t.Dict[str, t.Any]:
+    results = {}
+    for name in names:
+        timings = BENCHMARKS[name](vault_root, repeat)
+        results[name] = {"min": min(timings), "median": statistics.median(timings), "timings": timings}
+    return {
+        "version": _RESULTS_VERSION,
+        "commit": _get_commit(),
+        "python": platform.python_version(),
+        "spec": dataclasses.asdict(spec),
+        "repeat": repeat,
+        "results": results,
+    }
+
+
+def _check_import_budget(results: t.Dict[str, t.Any], budget: float) -> t.List[str]:
+    failures = []
+    if "import" in results["results"] and results["results"]["import"]["min"] * 1000 > budget:
+        failures.append(f"Importing the hook took {results['results']['import']['min'] * 1000:.1f} ms.")
+    _, imported = measure_import()
+    failures.extend(f"Importing the hook imported {module}." for module in DEFERRED_MODULES if module in imported)
+    return failures
+
+
+def _echo_comparison(baseline: t.Dict[str, t.Any], current: t.Dict[str, t.Any]) -> None:
+    if baseline["spec"] != current["spec"]:
+        click.echo("Warning: the baseline was measured on a different vault.", err=True)
+    for name, result in current["results"].items():
+        if name not in baseline["results"]:
+            continue
+        before, after = baseline["results"][name]["min"], result["min"]
+        click.echo(f"{name:<20} {before * 1000:>10.2f} ms {after * 1000:>10.2f} ms {after / before:>7.2f}x", err=True)
+
+
+@click.command()
+@click.help_option("--help", "-h")
+@click.option("--notes", default=VaultSpec.notes, show_default=True, help="Number of notes.")
+@click.option("--depth", default=VaultSpec.depth, show_default=True, help="Depth of the directory tree.")
+@click.option("--fan-out", default=VaultSpec.fan_out, show_default=True, help="Subdirectories of each directory.")
+@click.option("--links-per-note", default=VaultSpec.links_per_note, show_default=True, help="Wikilinks in a note.")
+@click.option("--dead-fraction", default=VaultSpec.dead_fraction, show_default=True, help="Fraction of dead links.")
+@click.option(
+    "--ambiguous-fraction",
+    default=VaultSpec.ambiguous_fraction,
+    show_default=True,
+    help="Fraction of links to names shared by two notes.",
+)
+@click.option("--submodules", default=VaultSpec.submodules, show_default=True, help="Number of submodules.")
+@click.option("--spaces/--no-spaces", default=VaultSpec.spaces, show_default=True, help="Spaces in names.")
+@click.option(
+    "--code-fraction", default=VaultSpec.code_fraction, show_default=True, help="Fraction of notes with code."
+)
+@click.option("--seed", default=VaultSpec.seed, show_default=True, help="Seed of the vault generator.")
+@click.option("--repeat", type=click.IntRange(min=1), default=5, show_default=True, help="Rounds of each benchmark.")
+@click.option("--only", multiple=True, type=click.Choice(list(BENCHMARKS)), help="Run only the given benchmarks.")
+@click.option("--output", "-o", type=click.Path(dir_okay=False), help="Write the results there instead of stdout.")
+@click.option(
+    "--compare",
+    type=click.Path(exists=True, dir_okay=False),
+    help="Results of an earlier run to compare the minimal timings with.",
+)
+@click.option(
+    "--import-budget",
+    type=float,
+    help="Fail if importing the hook takes longer, in milliseconds, or imports a module meant to be deferred.",
+)
+def main(
+    notes: int,
+    depth: int,
+    fan_out: int,
+    links_per_note: int,
+    dead_fraction: float,
+    ambiguous_fraction: float,
+    submodules: int,
+    spaces: bool,
+    code_fraction: float,
+    seed: int,
+    repeat: int,
+    only: t.Tuple[str, ...],
+    output: t.Optional[str],
+    compare: t.Optional[str],
+    import_budget: t.Optional[float],
+) -> None:
+    """Times the hot paths on a generated vault and prints the results as JSON.
+
+    Run from the repository root with `PYTHONPATH=src python -m benchmarks.run`.
+    """
+    spec = VaultSpec(
+        notes,
+        depth,
+        fan_out,
+        links_per_note,
+        dead_fraction,
+        ambiguous_fraction,
+        submodules,
+        spaces,
+        code_fraction,
+        seed,
+    )
+    with tempfile.TemporaryDirectory() as temp_dir:
+        vault_root = generate_vault(Path(temp_dir), spec)
+        results = run_benchmarks(vault_root, spec, only or BENCHMARKS, repeat)
+    dumped = json.dumps(results, indent=2)
+    if output:
+        Path(output).write_text(dumped + "\n")
+    else:
+        sys.stdout.write(dumped + "\n")
+    if compare:
+        _echo_comparison(json.loads(Path(compare).read_text()), results)
+    if import_budget is not None:
+        failures = _check_import_budget(results, import_budget)
+        for failure in failures:
+            click.echo(failure, err=True)
+        if failures:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,129 @@
+import os
+import random
+import typing as t
+from dataclasses import dataclass
+from pathlib import Path
+
+_WORDS = (
+    "lorem ipsum dolor sit amet consectetur adipiscing elit sed do eiusmod tempor incididunt ut labore et dolore "
+    "magna aliqua enim ad minim veniam quis nostrud exercitation ullamco laboris nisi aliquip ex ea commodo"
+).split()
+_SUBMODULE_FILES = 10
+# 2020-01-01: well out of the racy mtime window, so that the vault cache trusts what it reads
+_SETTLED_MTIME_NS = 1_577_836_800 * 10**9
+
+
+@dataclass(frozen=True)
+class VaultSpec:
+    notes: int = 1000
+    depth: int = 3
+    fan_out: int = 4
+    links_per_note: int = 5
+    dead_fraction: float = 0.05
+    ambiguous_fraction: float = 0.05
+    submodules: int = 1
+    spaces: bool = True
+    code_fraction: float = 0.2
+    seed: int = 0
+
+
+def _name(*parts: t.Any, spaces: bool) -> str:
+    return (" " if spaces else "_").join(str(part) for part in parts)
+
+
+def _directories(spec: VaultSpec) -> t.List[Path]:
+    directories = [Path()]
+    level = [Path()]
+    for _ in range(spec.depth):
+        level = [parent / _name("dir", i, spaces=spec.spaces) for parent in level for i in range(spec.fan_out)]
+        directories.extend(level)
+    return directories
+
+
+def _paragraph(rng: random.Random, links: t.List[str]) -> str:
+    words = [rng.choice(_WORDS) for _ in range(rng.randint(10, 30))]
+    for link in links:
+        words.insert(rng.randrange(len(words) + 1), link)
+    return " ".join(words)
+
+
+def _link(rng: random.Random, target: str) -> str:
+    # a quarter of the links carry their own title
+    return f"[[{target}|{target.title()}]]" if rng.random() < 0.25 else f"[[{target}]]"
+
+
+def _with_code(rng: random.Random, text: str, links: t.List[str]) -> str:
+    # links quoted in frontmatter and code are left alone by the formatter, yet they cost it a scan
+    link = links[0] if links else "[[note]]"
+    frontmatter = f'---\ntags: [bench]\nrelated: "{link}"\n---\n'
+    code = f"\n\n```markdown\nSee {link} and `{link}`.\n```\n\nInline `{link}` code.\n"
+    return frontmatter + text + code if rng.random() < 0.5 else text + code
+
+
+def settle_mtimes(root: Path) -> None:
+    for current, _, files in os.walk(root):
+        for name in files:
+            os.utime(os.path.join(current, name), ns=(_SETTLED_MTIME_NS, _SETTLED_MTIME_NS))
+        os.utime(current, ns=(_SETTLED_MTIME_NS, _SETTLED_MTIME_NS))
+
+
+def _draw_links(rng: random.Random, spec: VaultSpec, targets: t.List[str], shared_names: t.List[str]) -> t.List[str]:
+    links = []
+    for _ in range(spec.links_per_note):
+        draw = rng.random()
+        if draw < spec.dead_fraction:
+            links.append(_link(rng, _name("missing", rng.randrange(spec.notes + 1), spaces=spec.spaces)))
+        elif draw < spec.dead_fraction + spec.ambiguous_fraction and shared_names:
+            links.append(_link(rng, rng.choice(shared_names)))
+        else:
+            links.append(_link(rng, rng.choice(targets)))
+    return links
+
+
+def generate_vault(root: Path, spec: VaultSpec) -> Path:
+    # Lays out a repository at `root` with the vault in its `vault` directory and returns the vault root.
+    # The same spec always gives the same files, so results can be compared between commits.
+    rng = random.Random(spec.seed)
+    # drawn apart, so that the rest of the vault doesn't depend on the code fraction
+    code_rng = random.Random(f"{spec.seed}-code")
+    vault_root = root / "vault"
+    directories = _directories(spec)
+
+    files: t.Dict[Path, t.List[str]] = {}
+    targets = []
+    for i in range(spec.notes):
+        name = _name("note", i, spaces=spec.spaces)
+        files[rng.choice(directories) / f"{name}.md"] = []
+        targets.append(name)
+
+    shared_names = [_name("shared", i, spaces=spec.spaces) for i in range(int(spec.notes * spec.ambiguous_fraction))]
+    for name in shared_names:
+        for directory in rng.sample(directories, 2) if len(directories) > 1 else directories:
+            files[directory / f"{name}.md"] = []
+
+    gitmodules = []
+    for k in range(spec.submodules):
+        module = _name("module", k, spaces=spec.spaces)
+        gitmodules.append(
+            f'[submodule "module{k}"]\n\tpath = vault/{module}\n\turl = git@github.com:bench/module-{k}.git\n'
+        )
+        for j in range(_SUBMODULE_FILES):
+            name = _name("module", k, "note", j, spaces=spec.spaces)
+            files[Path(module) / f"{name}.md"] = []
+            targets.append(name)
+
+    for relative in files:
+        files[relative] = _draw_links(rng, spec, targets, shared_names)
+
+    (root / ".git").mkdir(parents=True, exist_ok=True)
+    (root / ".gitmodules").write_text("".join(gitmodules))
+    for relative, links in files.items():
+        path = vault_root / relative
+        path.parent.mkdir(parents=True, exist_ok=True)
+        paragraphs = [_paragraph(rng, links[i::3]) for i in range(3)]
+        text = f"# {path.stem}\n\n" + "\n\n".join(paragraphs) + "\n"
+        if code_rng.random() < spec.code_fraction:
+            text = _with_code(code_rng, text, links)
+        path.write_text(text)
+    settle_mtimes(root)
+    return vault_root
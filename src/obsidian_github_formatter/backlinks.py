@@ -0,0 +1,64 @@
+import os
+import time
+import typing as t
+from collections import defaultdict
+from pathlib import Path
+
+from .cache import (
+    Cache,
+    cached,
+)
+from .files import (
+    FileFormat,
+    read_file,
+)
+from .index import FileMap
+from .links import iter_link_targets
+from .storage import (
+    dump_snapshot,
+    load_snapshot,
+    trusted_mtime,
+)
+
+Backlinks = t.Dict[str, t.List[Path]]
+# relative path of a note -> (mtime_ns, size, link targets)
+_NoteLinks = t.Dict[str, t.Tuple[int, int, t.Tuple[str, ...]]]
+
+_BACKLINKS_SNAPSHOT_NAME = "backlinks.bin"
+
+
+def _iterate_notes(file_map: FileMap) -> t.Set[Path]:
+    return {path for paths in file_map.values() for path in paths if FileFormat.from_path(path) == FileFormat.markdown}
+
+
+def _scan_note_links(root: Path, notes: t.Iterable[Path], known: _NoteLinks) -> _NoteLinks:
+    started_at_ns = time.time_ns()
+    note_links: _NoteLinks = {}
+    for note in notes:
+        key = str(note)
+        try:
+            stat = os.stat(root / note)
+        except OSError:  # pragma: no cover
+            continue
+        entry = known.get(key)
+        if entry and entry[:2] == (stat.st_mtime_ns, stat.st_size):
+            targets = entry[2]
+        else:
+            targets = tuple(sorted(set(iter_link_targets(read_file(root / note)))))
+        note_links[key] = (trusted_mtime(stat.st_mtime_ns, started_at_ns), stat.st_size, targets)
+    return note_links
+
+
+@cached
+def build_backlinks(cache: Cache) -> Backlinks:
+    root = Path(cache.get_value("vault_root"))
+    file_map: FileMap = cache.get_value("build_file_map")
+    known = load_snapshot(cache, _BACKLINKS_SNAPSHOT_NAME)
+    note_links = _scan_note_links(root, _iterate_notes(file_map), known if isinstance(known, dict) else {})
+    dump_snapshot(cache, _BACKLINKS_SNAPSHOT_NAME, note_links)
+
+    backlinks: Backlinks = defaultdict(list)
+    for key in sorted(note_links):
+        for target in note_links[key][2]:
+            backlinks[target].append(Path(key))
+    return backlinks
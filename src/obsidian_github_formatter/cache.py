@@ -1,15 +1,47 @@
+import threading
+import time
 import typing as t
+from collections import (
+    ChainMap,
+    OrderedDict,
+)
 
 DataType = t.TypeVar("DataType")
 Cached = t.Callable[["Cache"], DataType]
 
 
+class _Computing(threading.local):
+    # names of the values being computed by the current thread, innermost last
+    def __init__(self) -> None:
+        self.names: t.List[str] = []
+
+
 class Cache(t.Generic[DataType]):
+    # Functions registered with `cached` are shared by every cache, `add_functions` adds ones of a single cache.
+    # A value is computed once, by the first thread asking for it. The values read while computing it are
+    # recorded as its dependencies: replacing or resetting any of them drops the value, to be computed again.
     _functions: t.ClassVar[t.Dict[str, Cached]] = {}
     _sentinel_value: t.ClassVar[object] = object()
 
-    def __init__(self, **initial: DataType) -> None:
+    def __init__(self, max_size: t.Optional[int] = None, ttl: t.Optional[float] = None, **initial: DataType) -> None:
         self._values: t.Dict[str, DataType] = initial
+        self._registry: t.ChainMap[str, Cached] = ChainMap({}, self._functions)
+        # computed values only, least recently used first; `max_size` and `ttl` never drop the given ones,
+        # so they're meant for caches whose values can all be computed again
+        self._max_size = max_size
+        self._ttl = ttl
+        self._bounded = max_size is not None or ttl is not None
+        self._computed_at: t.OrderedDict[str, float] = OrderedDict()
+        self._dependents: t.Dict[str, t.Set[str]] = {}
+        # bumped whenever a value is dropped, so that a computation that read a dropped value isn't stored
+        self._generations: t.Dict[str, int] = {}
+        self._lock = threading.RLock()
+        self._computing_locks: t.Dict[str, threading.RLock] = {}
+        self._computing = _Computing()
+        # computations in progress in any thread, when there are none, no dependency is to be recorded
+        self._active = 0
+        # seconds spent computing each value, including the values it depends on
+        self.computation_times: t.Dict[str, float] = {}
 
     def __repr__(self) -> str:
         return f"Cache({', '.join(self._values)})"
@@ -40,32 +72,114 @@ class Cache(t.Generic[DataType]):
             return registering_decorator(function)
         return registering_decorator
 
+    def add_functions(self, **functions: Cached) -> None:
+        with self._lock:
+            for name, function in functions.items():
+                self._registry.maps[0][name] = function
+                self._drop(name)
+
     def get_value(
         self, target: t.Union[str, t.Callable], default: DataType = _sentinel_value  # type: ignore
     ) -> DataType:
         function_name = target if isinstance(target, str) else target.__qualname__
-        if function_name not in self._values and function_name not in self._functions:
+        if self._active:
+            self._add_dependent(function_name)
+        value = self._values.get(function_name, self._sentinel_value)
+        if value is not self._sentinel_value and (not self._bounded or self._is_fresh(function_name)):
+            return value  # type: ignore
+        if function_name not in self._registry:
             if default is not self._sentinel_value:
                 return default
             else:
                 raise ValueError(
-                    f"No value '{target}' to get. Values: {set(self._values)}. Functions: {set(self._functions)}"
+                    f"No value '{target}' to get. Values: {set(self._values)}. Functions: {set(self._registry)}"
                 )
-        if function_name not in self._values:
-            self._values[function_name] = self._functions[function_name](self)
-        return self._values[function_name]
+        return self._compute(function_name)
+
+    def has_value(self, target: t.Union[str, t.Callable]) -> bool:
+        function_name = target if isinstance(target, str) else target.__qualname__
+        return function_name in self._values
 
     def add_values(self, **values: DataType) -> None:
-        self._values.update(values)
+        with self._lock:
+            for name, value in values.items():
+                if self._values.get(name, self._sentinel_value) is not value:
+                    self._drop(name)
+                    self._values[name] = value
 
     def reset(self, target: t.Union[str, t.Callable]) -> bool:
         function_name = target if isinstance(target, str) else target.__qualname__
-        if function_name not in self._functions:
-            raise ValueError(f"No function to reset. Functions: {set(self._functions)}")
-        if function_name not in self._values:
-            return False
-        del self._values[function_name]
-        return True
+        with self._lock:
+            had_value = function_name in self._values
+            # a given value has no function to compute it again, but what was computed from it can go
+            if function_name not in self._registry and not had_value:
+                raise ValueError(
+                    f"No function or value to reset. Values: {set(self._values)}. Functions: {set(self._registry)}"
+                )
+            self._drop(function_name)
+        return had_value
+
+    def _add_dependent(self, name: str) -> None:
+        computing = self._computing.names
+        if computing:
+            with self._lock:
+                self._dependents.setdefault(name, set()).add(computing[-1])
+
+    def _is_fresh(self, name: str) -> bool:
+        with self._lock:
+            computed_at = self._computed_at.get(name)
+            if computed_at is None:
+                return name in self._values
+            if self._ttl is not None and time.monotonic() - computed_at > self._ttl:
+                self._drop(name)
+                return False
+            self._computed_at.move_to_end(name)
+            return True
+
+    def _compute(self, name: str) -> DataType:
+        with self._lock:
+            computing_lock = self._computing_locks.setdefault(name, threading.RLock())
+        with computing_lock:
+            # another thread may have computed it meanwhile
+            value = self._values.get(name, self._sentinel_value)
+            if value is not self._sentinel_value and self._is_fresh(name):
+                return value  # type: ignore
+            generation = self._generations.get(name, 0)
+            computing = self._computing.names
+            computing.append(name)
+            with self._lock:
+                self._active += 1
+            started_at = time.perf_counter()
+            try:
+                value = self._registry[name](self)
+            finally:
+                computing.pop()
+                with self._lock:
+                    self._active -= 1
+            with self._lock:
+                self.computation_times[name] = time.perf_counter() - started_at
+                if name in self._values:
+                    return self._values[name]
+                if self._generations.get(name, 0) == generation:
+                    self._store(name, value)
+            return value
+
+    def _store(self, name: str, value: DataType) -> None:
+        self._values[name] = value
+        self._computed_at[name] = time.monotonic()
+        if self._max_size is not None:
+            while len(self._computed_at) > self._max_size:
+                self._drop(next(iter(self._computed_at)))
+
+    def _drop(self, name: str) -> None:
+        # the value and, transitively, every value computed from it
+        pending = [name]
+        while pending:
+            dropped = pending.pop()
+            self._generations[dropped] = self._generations.get(dropped, 0) + 1
+            self._values.pop(dropped, None)
+            self._computed_at.pop(dropped, None)
+            pending.extend(self._dependents.pop(dropped, ()))
 
 
 cached = Cache.register
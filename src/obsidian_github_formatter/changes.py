@@ -0,0 +1,87 @@
+import subprocess
+import typing as t
+from pathlib import Path
+
+from pca.packages.errors import (
+    ErrorCatalog,
+    error_builder,
+)
+
+from .backlinks import (
+    Backlinks,
+    build_backlinks,
+)
+from .cache import Cache
+from .files import FileFormat
+from .index import (
+    iterate_file_names,
+    relative_to_vault,
+)
+from .repository import get_repo_root
+
+# status letter, then paths relative to the repo root (two of them for renames and copies)
+Change = t.Tuple[str, t.Tuple[Path, ...]]
+
+_STATUSES_WITH_TWO_PATHS = ("R", "C")
+# a note's links may change meaning only when some file appears or disappears
+_STATUSES_CHANGING_NAMES = ("A", "D", "R", "C")
+
+
+class ChangesErrors(ErrorCatalog):
+    GitDiffFailed = error_builder()
+
+
+def _git_diff(repo_root: Path, ref: str) -> str:  # pragma: no cover
+    return subprocess.run(
+        ["git", "diff", "--name-status", "-z", "-M", ref, "--"],
+        cwd=repo_root,
+        check=True,
+        capture_output=True,
+        text=True,
+    ).stdout
+
+
+def parse_name_status(output: str) -> t.List[Change]:
+    tokens = output.split("\0")
+    changes = []
+    i = 0
+    while i < len(tokens) and tokens[i]:
+        status = tokens[i][0]
+        path_count = 2 if status in _STATUSES_WITH_TWO_PATHS else 1
+        changes.append((status, tuple(Path(p) for p in tokens[i + 1 : i + 1 + path_count])))
+        i += 1 + path_count
+    return changes
+
+
+def get_changed_notes(cache: Cache, ref: str) -> t.List[Path]:
+    repo_root: Path = cache.get_value(get_repo_root)
+    vault_root = Path(cache.get_value("vault_root"))
+    try:
+        changes = parse_name_status(_git_diff(repo_root, ref))
+    except (OSError, subprocess.CalledProcessError) as e:
+        cache.get_value("get_errors").append(ChangesErrors.GitDiffFailed(ref=ref, origin=e))
+        return []
+
+    notes: t.Set[Path] = set()
+    changed_names: t.Set[str] = set()
+    for status, paths in changes:
+        relative_paths = [relative_to_vault(repo_root / p, vault_root.resolve()) for p in paths]
+        if status in _STATUSES_CHANGING_NAMES:
+            changed_names.update(name for p in relative_paths if p for name in iterate_file_names(p))
+        current = relative_paths[-1]
+        if status != "D" and current and FileFormat.from_path(current) == FileFormat.markdown:
+            notes.add(current)
+    if changed_names:
+        backlinks: Backlinks = cache.get_value(build_backlinks)
+        notes.update(note for name in changed_names for note in backlinks.get(name, ()))
+    return [vault_root / note for note in sorted(notes) if (vault_root / note).exists()]
+
+
+def add_changed_notes(cache: Cache, filepaths: t.List[Path], ref: str) -> None:
+    # the given paths may be relative or spelled differently, each note is still processed once
+    selected = {path.resolve() for path in filepaths}
+    for path in get_changed_notes(cache, ref):
+        resolved = path.resolve()
+        if resolved not in selected:
+            selected.add(resolved)
+            filepaths.append(path)
@@ -0,0 +1,154 @@
+import typing as t
+from array import array
+from pathlib import Path
+
+_ID_TYPECODE = "I"
+
+
+class PathTable:
+    # Every path is stored once, as a string, and referred to by its position in the table.
+    # `Path` objects are heavy, so they are made only for the paths actually asked for.
+    def __init__(self, strings: t.Optional[t.List[str]] = None) -> None:
+        self.strings: t.List[str] = strings if strings is not None else []
+        self._ids: t.Optional[t.Dict[str, int]] = None
+        self._paths: t.Dict[int, Path] = {}
+
+    def __len__(self) -> int:
+        return len(self.strings)
+
+    def __getstate__(self) -> t.List[str]:
+        return self.strings
+
+    def __setstate__(self, strings: t.List[str]) -> None:
+        self.__init__(strings)  # type: ignore
+
+    def to_data(self) -> t.List[str]:
+        return self.strings
+
+    @classmethod
+    def from_data(cls, strings: t.Any) -> "PathTable":
+        if not isinstance(strings, list) or set(map(type, strings)) - {str}:
+            raise ValueError("Not a path table")
+        return cls(strings)
+
+    def append(self, path: t.Union[Path, str]) -> int:
+        # for paths known to be new, e.g. while walking a tree
+        path_id = len(self.strings)
+        self.strings.append(str(path))
+        if self._ids is not None:
+            self._ids[self.strings[path_id]] = path_id
+        return path_id
+
+    def intern(self, path: t.Union[Path, str]) -> int:
+        if self._ids is None:
+            self._ids = {string: path_id for path_id, string in enumerate(self.strings)}
+        path_id = self._ids.get(str(path))
+        return self.append(path) if path_id is None else path_id
+
+    def path(self, path_id: int) -> Path:
+        path = self._paths.get(path_id)
+        if path is None:
+            path = self._paths[path_id] = Path(self.strings[path_id])
+        return path
+
+
+class PathList(t.Sequence[Path]):
+    def __init__(self, table: PathTable) -> None:
+        self.table = table
+        self.ids = array(_ID_TYPECODE)
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    @t.overload
+    def __getitem__(self, index: int) -> Path:
+        ...  # pragma: no cover
+
+    @t.overload
+    def __getitem__(self, index: slice) -> t.List[Path]:
+        ...  # pragma: no cover
+
+    def __getitem__(self, index: t.Union[int, slice]) -> t.Union[Path, t.List[Path]]:
+        if isinstance(index, slice):
+            return [self.table.path(path_id) for path_id in self.ids[index]]
+        return self.table.path(self.ids[index])
+
+    def append(self, path_id: int) -> None:
+        self.ids.append(path_id)
+
+    def to_data(self) -> bytes:
+        return self.ids.tobytes()
+
+    @classmethod
+    def from_data(cls, table: PathTable, ids: bytes) -> "PathList":
+        paths = cls(table)
+        paths.ids.frombytes(ids)
+        if paths.ids and max(paths.ids) >= len(table):
+            raise ValueError("Path id out of the table")
+        return paths
+
+
+class CompactFileMap(t.MutableMapping[str, t.List[Path]]):
+    # name -> paths with the name; the single path of an unambiguous name is kept as a bare id
+    def __init__(self, table: t.Optional[PathTable] = None) -> None:
+        self.table = table if table is not None else PathTable()
+        self._entries: t.Dict[str, t.Union[int, t.Tuple[int, ...]]] = {}
+
+    def __repr__(self) -> str:
+        return f"{type(self).__name__}({dict(self)!r})"
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __iter__(self) -> t.Iterator[str]:
+        return iter(self._entries)
+
+    def __contains__(self, name: object) -> bool:
+        return name in self._entries
+
+    def __getitem__(self, name: str) -> t.List[Path]:
+        return self._paths(self._entries[name])
+
+    def get(self, name: str, default: t.Any = None) -> t.Any:
+        ids = self._entries.get(name)
+        if ids is None:
+            return default
+        if ids.__class__ is int:
+            # the fast path of the link resolution: one path with the name, already made
+            path = self.table._paths.get(ids)
+            if path is not None:
+                return [path]
+        return self._paths(ids)
+
+    def __setitem__(self, name: str, paths: t.List[Path]) -> None:
+        ids = tuple(self.table.intern(path) for path in paths)
+        self._entries[name] = ids[0] if len(ids) == 1 else ids
+
+    def __delitem__(self, name: str) -> None:
+        del self._entries[name]
+
+    def to_data(self) -> t.Dict[str, t.Union[int, t.Tuple[int, ...]]]:
+        # of the entries only, the table is usually shared with other structures
+        return self._entries
+
+    @classmethod
+    def from_data(cls, table: PathTable, entries: t.Any) -> "CompactFileMap":
+        if not isinstance(entries, dict) or set(map(type, entries.values())) - {int, tuple}:
+            raise ValueError("Not file map entries")
+        file_map = cls(table)
+        file_map._entries = entries
+        return file_map
+
+    def add_id(self, name: str, path_id: int) -> None:
+        ids = self._entries.get(name)
+        if ids is None:
+            self._entries[name] = path_id
+        elif isinstance(ids, int):
+            self._entries[name] = (ids, path_id)
+        else:
+            self._entries[name] = (*ids, path_id)
+
+    def _paths(self, ids: t.Union[int, t.Tuple[int, ...]]) -> t.List[Path]:
+        if isinstance(ids, int):
+            return [self.table.path(ids)]
+        return [self.table.path(path_id) for path_id in ids]
@@ -1,9 +1,8 @@
+import dataclasses
 import typing as t
 from dataclasses import dataclass
 from pathlib import Path
 
-import dacite
-import yaml
 from pca.packages.errors import (
     ErrorCatalog,
     error_builder,
@@ -27,6 +26,13 @@ class LinksConfig:
 class Config:
     links: LinksConfig = LinksConfig()
 
+    def to_data(self) -> t.Dict[str, t.Any]:
+        return dataclasses.asdict(self)
+
+    @classmethod
+    def from_data(cls, data: t.Any) -> "Config":
+        return cls(links=LinksConfig(**data["links"]))
+
 
 class ConfigErrors(ErrorCatalog):
     ConfigFileNotReadable = error_builder()
@@ -41,6 +47,10 @@ def get_config(cache: Cache) -> Config:
     config_filepath = root / _CONFIG_FILE_NAME
     if not config_filepath.exists():
         return Config()
+    # only imported for a vault that has a config file
+    import dacite
+    import yaml
+
     try:
         contents = _read(config_filepath)
         return dacite.from_dict(Config, contents)
@@ -56,5 +66,7 @@ def get_config(cache: Cache) -> Config:
 
 
 def _read(filename: Path) -> dict:  # pragma: no cover
+    import yaml
+
     with open(filename) as f:
         return yaml.safe_load(f)
@@ -1,19 +1,23 @@
+import functools
 import typing as t
 
-from colorama import (
-    Fore,
-    init,
-)
 
-# Initialize colorama
-init()
+@functools.lru_cache(maxsize=None)
+def init_console() -> t.Any:
+    # colorama wraps the standard streams, it's only set up once there's something to print
+    import colorama
+
+    colorama.init()
+    return colorama.Fore
 
 
 def color_header(content: str) -> str:
+    Fore = init_console()
     return Fore.YELLOW + content + Fore.RESET
 
 
 def color_diff(diff: t.Iterator[str]) -> t.Generator[str, None, None]:
+    Fore = init_console()
     for line in diff:
         if line.startswith("-"):
             yield Fore.RED + line
@@ -0,0 +1,135 @@
+import os
+import time
+import typing as t
+from dataclasses import dataclass
+from pathlib import Path
+
+from .cache import (
+    Cache,
+    cached,
+)
+from .config import (
+    _CONFIG_FILE_NAME,
+    Config,
+    ConfigErrors,
+    get_config,
+)
+from .errors import Errors
+from .repository import (
+    SubmoduleTable,
+    get_repo_root,
+    get_submodules,
+)
+from .storage import (
+    UNTRUSTED_MTIME,
+    dump_snapshot,
+    get_cache_dir,
+    load_snapshot,
+    trusted_mtime,
+)
+
+_SNAPSHOT_NAME = "environment.bin"
+
+FileStat = t.Optional[t.Tuple[int, int]]
+# the directory holding `.git`, then the size and mtime of the config and `.gitmodules`, None for a missing file
+Sources = t.Tuple[str, FileStat, FileStat]
+
+
+@dataclass(frozen=True)
+class VaultEnvironment:
+    vault_root: str
+    sources: Sources
+    config: Config
+    submodules: SubmoduleTable
+    repo_root: Path
+
+    def to_data(self) -> t.Tuple[t.Any, ...]:
+        return self.vault_root, self.sources, self.config.to_data(), self.submodules.to_data(), str(self.repo_root)
+
+    @classmethod
+    def from_data(cls, data: t.Any) -> "VaultEnvironment":
+        vault_root, sources, config, submodules, repo_root = data
+        return cls(
+            vault_root=vault_root,
+            sources=sources,
+            config=Config.from_data(config),
+            submodules=SubmoduleTable.from_data(submodules),
+            repo_root=Path(repo_root),
+        )
+
+
+def _stat(path: Path, scan_started_at_ns: int) -> FileStat:
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return stat.st_size, trusted_mtime(stat.st_mtime_ns, scan_started_at_ns)
+
+
+@cached
+def get_environment_sources(cache: Cache) -> Sources:
+    # taken before anything is parsed, so that a file modified meanwhile is read again next time
+    vault_root = Path(cache.get_value("vault_root"))
+    started_at_ns = time.time_ns()
+    # only the existence of `.git` matters, git itself keeps modifying the directory
+    git_root = vault_root if os.path.exists(vault_root / ".git") else vault_root.parent
+    return (
+        str(git_root),
+        _stat(vault_root / _CONFIG_FILE_NAME, started_at_ns),
+        _stat(git_root / ".gitmodules", started_at_ns),
+    )
+
+
+def sources_trusted(sources: Sources) -> bool:
+    # a file modified too recently may be modified again without its stat changing
+    return all(stat is None or stat[1] != UNTRUSTED_MTIME for stat in sources[1:])
+
+
+@cached
+def get_stored_environment(cache: Cache) -> t.Optional[VaultEnvironment]:
+    environment = load_snapshot(cache, _SNAPSHOT_NAME, VaultEnvironment.from_data)
+    if (
+        environment is None
+        or environment.vault_root != os.path.abspath(cache.get_value("vault_root"))
+        or environment.sources != cache.get_value(get_environment_sources)
+    ):
+        return None
+    return environment
+
+
+def load_environment(cache: Cache) -> bool:
+    # Fills the cache with the config, submodules and repo root stored by an earlier run, so that neither
+    # `.ogf-config.yaml` nor `.gitmodules` is parsed again. Values already in the cache are kept.
+    environment: t.Optional[VaultEnvironment] = cache.get_value(get_stored_environment)
+    if environment is None:
+        return False
+    values = {
+        get_config.__qualname__: environment.config,
+        get_submodules.__qualname__: environment.submodules,
+        get_repo_root.__qualname__: environment.repo_root,
+    }
+    cache.add_values(**{name: value for name, value in values.items() if not cache.has_value(name)})
+    return True
+
+
+def save_environment(cache: Cache) -> None:
+    if cache.get_value(get_cache_dir) is None or cache.get_value(get_stored_environment) is not None:
+        return
+    if not all(cache.has_value(function) for function in (get_config, get_submodules, get_repo_root)):
+        # the run didn't need all of them, the next one reads what it needs
+        return
+    sources: Sources = cache.get_value(get_environment_sources)
+    if not sources_trusted(sources):
+        return
+    errors: Errors = cache.get_value("get_errors")
+    if any(error.catalog is ConfigErrors for error in errors):
+        # a config that failed to load has to report its error again
+        return
+    environment = VaultEnvironment(
+        vault_root=os.path.abspath(cache.get_value("vault_root")),
+        sources=sources,
+        config=cache.get_value(get_config),
+        submodules=cache.get_value(get_submodules),
+        repo_root=cache.get_value(get_repo_root),
+    )
+    dump_snapshot(cache, _SNAPSHOT_NAME, environment.to_data())
@@ -1,3 +1,4 @@
+import importlib
 import typing as t
 
 from pca.packages.errors import ExceptionWithCode
@@ -6,6 +7,8 @@ from .cache import cached
 
 Errors = t.List[ExceptionWithCode]
 Notifications = t.List[str]
+SerializedError = t.Tuple[str, str, str, t.Dict[str, t.Any]]
+_PLAIN_TYPES = (str, int, float, bool, type(None), list, tuple)
 
 
 @cached
@@ -16,3 +19,21 @@ def get_errors(_: t.Any) -> Errors:
 @cached
 def get_notifications(_: t.Any) -> Notifications:
     return []
+
+
+def serialize_error(error: ExceptionWithCode) -> SerializedError:
+    # Error classes are built dynamically by `error_builder` and can't be pickled by reference. The arguments are
+    # sent as plain data, an exception given as the origin of the error by its message.
+    catalog = error.catalog
+    kwargs = {name: value if isinstance(value, _PLAIN_TYPES) else str(value) for name, value in error.kwargs.items()}
+    return (catalog.__module__, catalog.__qualname__, error.code, kwargs)
+
+
+def deserialize_error(serialized: SerializedError) -> ExceptionWithCode:
+    module_name, catalog_name, code, kwargs = serialized
+    if module_name.partition(".")[0] != __name__.partition(".")[0]:
+        raise ValueError(f"Not an error of this package: {module_name}")
+    catalog: t.Any = importlib.import_module(module_name)
+    for name in catalog_name.split("."):
+        catalog = getattr(catalog, name)
+    return getattr(catalog, code)(**kwargs)
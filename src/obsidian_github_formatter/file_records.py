@@ -0,0 +1,142 @@
+import dataclasses
+import hashlib
+import mmap
+import os
+import time
+import typing as t
+from dataclasses import (
+    dataclass,
+    field,
+)
+from pathlib import Path
+
+from .cache import (
+    Cache,
+    cached,
+)
+from .index import FileMap
+from .repository import get_submodules
+from .storage import (
+    UNTRUSTED_MTIME,
+    dump_snapshot,
+    get_cache_dir,
+    load_snapshot,
+    trusted_mtime,
+)
+
+_SNAPSHOT_NAME = "files.bin"
+
+# every link name looked up while processing a note, with the paths it resolved to at that time
+TargetState = t.Tuple[t.Tuple[str, t.Tuple[Path, ...]], ...]
+
+
+@dataclass(frozen=True)
+class FileRecord:
+    size: int
+    mtime_ns: int
+    digest: bytes
+    targets: TargetState
+
+    def to_data(self) -> t.Tuple[t.Any, ...]:
+        targets = tuple((link, tuple(str(path) for path in paths)) for link, paths in self.targets)
+        return self.size, self.mtime_ns, self.digest, targets
+
+    @classmethod
+    def from_data(cls, data: t.Any) -> "FileRecord":
+        size, mtime_ns, digest, targets = data
+        return cls(size, mtime_ns, digest, tuple((link, tuple(map(Path, paths))) for link, paths in targets))
+
+
+def content_digest(data: t.Union[bytes, mmap.mmap]) -> bytes:
+    # of the raw bytes of the file, so that a note can be recorded without being decoded
+    return hashlib.blake2b(data, digest_size=16).digest()
+
+
+def get_target_state(file_map: FileMap, links: t.Iterable[str]) -> TargetState:
+    return tuple((link, tuple(file_map.get(link, ()))) for link in links)
+
+
+def record_key(path: Path) -> str:
+    return os.path.abspath(path)
+
+
+@dataclass
+class FileRecords:
+    # Notes which needed no change and reported no error in a previous run. Valid for one environment
+    # (config, submodules, link prefix) only, as any of them changes how every link is rendered.
+    environment: str
+    records: t.Dict[str, FileRecord] = field(default_factory=dict)
+    new_records: t.Dict[str, FileRecord] = field(default_factory=dict, repr=False)
+
+    def lookup(self, path: Path, file_map: FileMap) -> t.Optional[FileRecord]:
+        key = record_key(path)
+        record = self.records.get(key)
+        if record is None:
+            return None
+        try:
+            stat = path.stat()
+            if stat.st_size != record.size:
+                return None
+            if stat.st_mtime_ns != record.mtime_ns:
+                # touched, checked out again or saved within the racy window: the contents tell
+                if content_digest(path.read_bytes()) != record.digest:
+                    return None
+                record = dataclasses.replace(record, mtime_ns=trusted_mtime(stat.st_mtime_ns, time.time_ns()))
+                if record.mtime_ns != UNTRUSTED_MTIME:
+                    self.add(key, record)
+        except OSError:
+            return None
+        # a link target appearing or disappearing changes the result
+        if get_target_state(file_map, (link for link, _ in record.targets)) != record.targets:
+            return None
+        return record
+
+    def add(self, key: str, record: FileRecord) -> None:
+        self.records[key] = self.new_records[key] = record
+
+    def update(self, records: t.Dict[str, FileRecord]) -> None:
+        self.records.update(records)
+        self.new_records.update(records)
+
+    def take_new(self) -> t.Dict[str, FileRecord]:
+        new_records, self.new_records = self.new_records, {}
+        return new_records
+
+
+def _get_environment(cache: Cache) -> str:
+    values = (
+        cache.get_value("get_config"),
+        list(cache.get_value(get_submodules)),
+        cache.get_value("link_prefix", ""),
+    )
+    return hashlib.blake2b(repr(values).encode(), digest_size=16).hexdigest()
+
+
+@cached
+def get_file_records(cache: Cache) -> t.Optional[FileRecords]:
+    if cache.get_value(get_cache_dir) is None:
+        return None
+    environment = _get_environment(cache)
+    snapshot = load_snapshot(cache, _SNAPSHOT_NAME, _records_from_data)
+    if snapshot is not None and snapshot[0] == environment:
+        return FileRecords(environment, snapshot[1])
+    return FileRecords(environment)
+
+
+def records_to_data(records: t.Dict[str, FileRecord]) -> t.Dict[str, t.Tuple[t.Any, ...]]:
+    return {key: record.to_data() for key, record in records.items()}
+
+
+def records_from_data(data: t.Any) -> t.Dict[str, FileRecord]:
+    return {key: FileRecord.from_data(record) for key, record in data.items()}
+
+
+def _records_from_data(data: t.Any) -> t.Tuple[str, t.Dict[str, FileRecord]]:
+    environment, records = data
+    return environment, records_from_data(records)
+
+
+def save_file_records(cache: Cache) -> None:
+    file_records: t.Optional[FileRecords] = cache.get_value(get_file_records)
+    if file_records is not None and file_records.take_new():
+        dump_snapshot(cache, _SNAPSHOT_NAME, (file_records.environment, records_to_data(file_records.records)))
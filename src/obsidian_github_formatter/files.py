@@ -1,6 +1,10 @@
-import difflib
-import shutil
+import contextlib
+import locale
+import mmap
+import os
+import threading
 import typing as t
+from collections import deque
 from dataclasses import dataclass
 from enum import Enum
 from pathlib import Path
@@ -18,32 +22,327 @@ def read_file(filename: Path) -> str:  # pragma: no cover
         return f.read()
 
 
-def save_file(path: Path, contents: str, make_backups: bool = False) -> None:  # pragma: no cover
-    if make_backups:
-        shutil.copyfile(str(path), f"{str(path)}.{_BACKUP_EXTENSION}")
-    with open(path, "w") as f:
-        f.write(contents)
+def read_chunks(path: Path, chunk_size: int) -> t.Generator[str, None, None]:
+    with open(path, "r") as f:
+        while chunk := f.read(chunk_size):
+            yield chunk
+
+
+@contextlib.contextmanager
+def map_file(path: Path) -> t.Iterator[t.Union[mmap.mmap, bytes]]:
+    # the contents as they're on the disk, neither copied into a buffer of their own nor decoded
+    with open(path, "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            # an empty file can't be mapped
+            yield b""
+            return
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            yield mapped
+
+
+# Writes files atomically: contents go to a temporary file in the same directory first, which then
+# replaces the target. Directories are fsync-ed in one batch, by `flush`, at the end of the run.
+class FileWriter:
+    def __init__(self) -> None:
+        self._pending_dirs: t.Set[Path] = set()
+        self._lock = threading.Lock()
+
+    def save(self, path: Path, contents: str, make_backups: bool = False) -> bool:
+        data = _encode(contents)
+        if _has_contents(path, data):
+            # nothing to do, keeping the mtime intact
+            return False
+        with self.temporary(path, "wb") as f:
+            f.write(data)
+        self.replace(path, Path(f.name), make_backups=make_backups)
+        return True
+
+    def save_chunks(self, path: Path, chunks: t.Iterable[str], compare_only: bool = False) -> bool:
+        # Compares the chunks with the file as they come. A temporary file is only started at the first
+        # difference, with the matching part copied over, so an unchanged file is read once and never written.
+        # The chunks are always consumed whole.
+        chunks = iter(chunks)
+        with _open_existing(path) as existing:
+            matched = 0
+            data = b""
+            for chunk in chunks:
+                data = _encode(chunk)
+                if existing is None or existing.read(len(data)) != data:
+                    break
+                matched += len(data)
+                data = b""
+            else:
+                if existing is not None and not existing.read(1):
+                    return False
+            if compare_only:
+                for _ in chunks:
+                    pass
+                return True
+            with self.temporary(path, "wb") as f:
+                if existing is not None:
+                    _copy_prefix(existing, f, matched)
+                f.write(data)
+                for chunk in chunks:
+                    f.write(_encode(chunk))
+        self.replace(path, Path(f.name))
+        return True
+
+    @contextlib.contextmanager
+    def temporary(self, path: Path, mode: str = "w") -> t.Generator[t.IO, None, None]:
+        path = _link_target(path)
+        temp_path = path.parent / f".{path.name}.{os.urandom(4).hex()}.tmp"
+        # `os.open` applies the umask, just as creating the file directly would
+        f = open(temp_path, mode, opener=lambda p, flags: os.open(p, flags | os.O_EXCL, 0o666))
+        try:
+            with f:
+                yield f
+                f.flush()
+                os.fsync(f.fileno())
+        except BaseException:
+            os.unlink(temp_path)
+            raise
+
+    def replace(self, path: Path, new_path: Path, make_backups: bool = False) -> None:
+        path = _link_target(path)
+        if path.exists():
+            import shutil
+
+            shutil.copymode(str(path), str(new_path))
+            if make_backups:
+                _make_backup(path)
+        os.replace(new_path, path)
+        with self._lock:
+            self._pending_dirs.add(path.parent)
+
+    def flush(self) -> None:
+        with self._lock:
+            dirs, self._pending_dirs = self._pending_dirs, set()
+        for directory in sorted(dirs):
+            try:
+                fd = os.open(directory, os.O_RDONLY)
+            except OSError:  # pragma: no cover
+                # eg. directories can't be opened on Windows, where renames are durable anyway
+                continue
+            try:
+                os.fsync(fd)
+            finally:
+                os.close(fd)
+
+
+def _link_target(path: Path) -> Path:
+    # replacing a symlink would turn it into a regular file and leave the note it points to as it was
+    return Path(os.path.realpath(path)) if os.path.islink(path) else path
+
+
+@contextlib.contextmanager
+def _open_existing(path: Path) -> t.Iterator[t.Optional[t.BinaryIO]]:
+    try:
+        f = open(path, "rb")
+    except FileNotFoundError:
+        yield None
+        return
+    with f:
+        yield f
+
+
+def _copy_prefix(source: t.BinaryIO, target: t.IO, size: int) -> None:
+    source.seek(0)
+    while size:
+        data = source.read(min(size, 1 << 20))
+        target.write(data)
+        size -= len(data)
+
+
+def _encode(contents: str) -> bytes:
+    # the same bytes as writing the text with `open(path, "w")`
+    if os.linesep != "\n":  # pragma: no cover
+        contents = contents.replace("\n", os.linesep)
+    return contents.encode(locale.getpreferredencoding(False))
+
+
+def _has_contents(path: Path, data: bytes) -> bool:
+    try:
+        if os.stat(path).st_size != len(data):
+            return False
+        with open(path, "rb") as f:
+            return f.read() == data
+    except OSError:
+        return False
+
+
+def _make_backup(path: Path) -> None:
+    backup_path = Path(f"{str(path)}.{_BACKUP_EXTENSION}")
+    if backup_path.exists():
+        backup_path.unlink()
+    try:
+        # the original is about to be replaced by a new inode, so the old one may just stay as the backup
+        os.link(path, backup_path)
+    except OSError:  # pragma: no cover
+        import shutil
+
+        shutil.copyfile(str(path), str(backup_path))
+
+
+_writer = FileWriter()
+
+
+def save_file(path: Path, contents: str, make_backups: bool = False) -> bool:
+    return _writer.save(path, contents, make_backups=make_backups)
+
+
+def save_chunks(path: Path, chunks: t.Iterable[str], compare_only: bool = False) -> bool:
+    return _writer.save_chunks(path, chunks, compare_only=compare_only)
+
+
+def temporary_sibling(path: Path) -> t.ContextManager[t.IO]:
+    return _writer.temporary(path)
+
+
+def replace_file(path: Path, new_path: Path, make_backups: bool = False) -> None:
+    _writer.replace(path, new_path, make_backups=make_backups)
+
+
+def flush_writes() -> None:
+    _writer.flush()
 
 
 def diff_files(text_a: str, text_b: str) -> t.Iterator[str]:
+    import difflib
+
     return difflib.unified_diff(text_a.splitlines(), text_b.splitlines())
 
 
+LinePair = t.Tuple[str, str]
+
+
+def iter_line_pairs(segments: t.Iterable[t.Tuple[str, str]]) -> t.Generator[LinePair, None, None]:
+    # segments of both sides have to keep the same number of lines each, ie. edits never touch line breaks
+    tail_a = tail_b = ""
+    for segment_a, segment_b in segments:
+        lines_a = (tail_a + segment_a).split("\n")
+        lines_b = (tail_b + segment_b).split("\n")
+        tail_a, tail_b = lines_a.pop(), lines_b.pop()
+        yield from zip(lines_a, lines_b)
+    if tail_a or tail_b:
+        yield tail_a, tail_b
+
+
+_DIFF_CONTEXT = 3
+_MAX_HUNK_LINES = 1000
+
+
+def _format_range(start: int, length: int) -> str:
+    if length == 1:
+        return f"{start + 1}"
+    return f"{start + 1 if length else start},{length}"
+
+
+def _render_hunk(start: int, lines: t.List[LinePair]) -> t.Generator[str, None, None]:
+    line_range = _format_range(start, len(lines))
+    yield f"@@ -{line_range} +{line_range} @@\n"
+    changed: t.List[LinePair] = []
+    for a, b in lines:
+        if a != b:
+            changed.append((a, b))
+            continue
+        yield from (f"-{a_}" for a_, _ in changed)
+        yield from (f"+{b_}" for _, b_ in changed)
+        changed = []
+        yield f" {a}"
+    yield from (f"-{a_}" for a_, _ in changed)
+    yield from (f"+{b_}" for _, b_ in changed)
+
+
+def stream_diff(line_pairs: t.Iterable[LinePair]) -> t.Generator[str, None, None]:
+    # Same output as `diff_files` for texts differing by edits within lines, but holding only one hunk
+    # in memory at a time. Hunks longer than `_MAX_HUNK_LINES` are split into adjacent ones.
+    context: t.Deque[LinePair] = deque(maxlen=_DIFF_CONTEXT)
+    hunk: t.List[LinePair] = []
+    hunk_start = trailing_equal = 0
+    header_sent = False
+    for number, (a, b) in enumerate(line_pairs):
+        if a == b:
+            if not hunk:
+                context.append((a, b))
+                continue
+            hunk.append((a, b))
+            trailing_equal += 1
+            if trailing_equal > 2 * _DIFF_CONTEXT:
+                # the gap is too long to join the next change into this hunk
+                yield from _render_hunk(hunk_start, hunk[: len(hunk) - trailing_equal + _DIFF_CONTEXT])
+                context.extend(hunk[-_DIFF_CONTEXT:])
+                hunk = []
+            continue
+        if not header_sent:
+            header_sent = True
+            yield "--- \n"
+            yield "+++ \n"
+        if not hunk:
+            hunk_start = number - len(context)
+            hunk = list(context)
+            context.clear()
+        elif trailing_equal == 0 and len(hunk) >= _MAX_HUNK_LINES:
+            yield from _render_hunk(hunk_start, hunk)
+            hunk_start, hunk = number, []
+        trailing_equal = 0
+        hunk.append((a, b))
+    if hunk:
+        yield from _render_hunk(hunk_start, hunk[: len(hunk) - max(0, trailing_equal - _DIFF_CONTEXT)])
+
+
+def is_hidden(name: str) -> bool:
+    return name.startswith(".")
+
+
 def filter_out_filepaths(filepath: Path) -> bool:
-    return filepath.name.startswith(".")
+    return is_hidden(filepath.name)
+
+
+# (name, is_dir) of the visible entries of a directory
+Listing = t.Tuple[t.Tuple[str, bool], ...]
+ListDir = t.Callable[[Path, Path], Listing]
+
+
+def list_visible_entries(current: Path, _: Path) -> Listing:
+    # `DirEntry.is_dir` is answered from the directory listing itself on most platforms, no stat needed
+    with os.scandir(current) as it:
+        return tuple((entry.name, entry.is_dir()) for entry in it if not is_hidden(entry.name))
+
+
+class WalkEntry(t.NamedTuple):
+    path: Path
+    relative: Path
+    is_dir: bool
+    depth: int
+    is_last: bool
+
+
+def walk_tree(top: Path, list_dir: ListDir = list_visible_entries) -> t.Generator[WalkEntry, None, None]:
+    # depth-first and sorted by name, with no recursion, so any depth of a vault is fine
+    stack: t.List[WalkEntry] = []
+
+    def push_entries(current: Path, relative: Path, depth: int) -> None:
+        entries = sorted(list_dir(current, relative))
+        last = len(entries) - 1
+        for i in range(last, -1, -1):
+            name, is_dir = entries[i]
+            stack.append(WalkEntry(current / name, relative / name, is_dir, depth, i == last))
+
+    push_entries(top, Path(), 0)
+    while stack:
+        entry = stack.pop()
+        yield entry
+        if entry.is_dir:
+            push_entries(entry.path, entry.relative, entry.depth + 1)
 
 
 def expand_dir(current: Path) -> t.Generator[Path, None, None]:
     if not current.is_dir():
         yield current
         return
-    contents = sorted(current.iterdir())
-    for path in contents:
-        if not filter_out_filepaths(path):
-            if path.is_dir():
-                yield from expand_dir(path)
-            elif FileFormat.markdown == FileFormat.from_path(path):
-                yield path
+    for entry in walk_tree(current):
+        if not entry.is_dir and FileFormat.markdown == FileFormat.from_path(entry.path):
+            yield entry.path
 
 
 class FileFormat(Enum):
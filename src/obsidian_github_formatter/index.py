@@ -1,7 +1,15 @@
-import json
+import bisect
+import functools
+import itertools
+import os
+import time
 import typing as t
+from array import array
 from collections import defaultdict
-from dataclasses import dataclass
+from dataclasses import (
+    dataclass,
+    field,
+)
 from enum import Enum
 from pathlib import Path
 
@@ -9,9 +17,27 @@ from .cache import (
     Cache,
     cached,
 )
+from .compact import (
+    CompactFileMap,
+    PathList,
+    PathTable,
+)
 from .files import (
     FileFormat,
-    filter_out_filepaths,
+    ListDir,
+    Listing,
+    WalkEntry,
+    expand_dir,
+    flush_writes,
+    is_hidden,
+    list_visible_entries,
+    save_chunks,
+    walk_tree,
+)
+from .storage import (
+    dump_snapshot,
+    load_snapshot,
+    trusted_mtime,
 )
 
 
@@ -35,62 +61,318 @@ class IndexLine:
 
 
 Summary = t.DefaultDict[FileFormat, int]
-FileMap = t.Dict[str, t.List[Path]]
+FileMap = t.MutableMapping[str, t.List[Path]]
 
 
-def _iterate_file_names(filepath: Path) -> t.Generator[str, None, None]:
+def iterate_file_names(filepath: Path) -> t.Generator[str, None, None]:
     yield filepath.name
     if filepath.suffix.lower() == ".md":
         yield filepath.stem
 
 
-def _walk_path_tree(
-    root: Path, current: Path, summary: Summary, file_map: FileMap, prefix: t.Tuple[TreeElements, ...] = ()
-) -> t.Generator[IndexLine, None, None]:
-    contents = sorted(current.iterdir())
-    elements = [TreeElements.tee] * (len(contents) - 1) + [TreeElements.last]
-    for element, path in zip(elements, contents):
-        if filter_out_filepaths(path):
-            continue
-        elif path.is_dir():
-            yield IndexLine(prefix + (element,), path)
-            summary[FileFormat.directory] += 1
-            extension = TreeElements.branch if element == TreeElements.tee else TreeElements.space
-            yield from _walk_path_tree(root, path, summary=summary, file_map=file_map, prefix=prefix + (extension,))
-        else:
-            yield IndexLine(prefix + (element,), path)
-            for file_name in _iterate_file_names(path):
-                file_map[file_name].append(path.relative_to(root))
-            summary[FileFormat.from_path(path)] += 1  # type: ignore
+Listings = t.Dict[str, t.Tuple[int, Listing]]
+
+
+@dataclass
+class _DirectoryLister:
+    root: Path
+    known: Listings = field(default_factory=dict)
+    listings: Listings = field(default_factory=dict)
+    started_at_ns: int = field(default_factory=time.time_ns)
+
+    def list_dir(self, current: Path, relative: Path) -> Listing:
+        key = str(relative)
+        mtime_ns = current.stat().st_mtime_ns
+        known = self.known.get(key)
+        entries = known[1] if known and known[0] == mtime_ns else list_visible_entries(current, relative)
+        self.listings[key] = (trusted_mtime(mtime_ns, self.started_at_ns), entries)
+        return entries
+
+
+@dataclass(frozen=True)
+class VaultScan:
+    file_map: FileMap
+    # relative paths of the markdown notes, sorted
+    notes: t.Sequence[Path]
+
+    def to_data(self) -> t.Tuple[t.Any, ...]:
+        file_map = t.cast(CompactFileMap, self.file_map)
+        notes = t.cast(PathList, self.notes)
+        return file_map.table.to_data(), file_map.to_data(), notes.to_data()
+
+    @classmethod
+    def from_data(cls, data: t.Any) -> "VaultScan":
+        strings, entries, notes = data
+        table = PathTable.from_data(strings)
+        return cls(file_map=CompactFileMap.from_data(table, entries), notes=PathList.from_data(table, notes))
+
+
+def _scan_vault(root: Path, lister: _DirectoryLister) -> VaultScan:
+    # the walk is sorted, and so are the paths of ambiguous targets, which show up in the errors
+    table = PathTable()
+    file_map = CompactFileMap(table)
+    notes = PathList(table)
+    for entry in walk_tree(root, lister.list_dir):
+        if not entry.is_dir:
+            path_id = table.append(entry.relative)
+            for file_name in iterate_file_names(entry.relative):
+                file_map.add_id(file_name, path_id)
+            if FileFormat.from_path(entry.relative) == FileFormat.markdown:
+                notes.append(path_id)
+    return VaultScan(file_map=file_map, notes=notes)
+
+
+def add_to_file_map(file_map: FileMap, path: Path) -> None:
+    # the paths are read and stored back, as a compact file map hands out copies
+    for file_name in iterate_file_names(path):
+        paths = file_map.get(file_name, [])
+        if path not in paths:
+            bisect.insort(paths, path)
+            file_map[file_name] = paths
+
+
+def remove_from_file_map(file_map: FileMap, path: Path) -> None:
+    for file_name in iterate_file_names(path):
+        paths = file_map.get(file_name)
+        if paths and path in paths:
+            paths.remove(path)
+            if paths:
+                file_map[file_name] = paths
+            else:
+                del file_map[file_name]
+
+
+@functools.lru_cache(maxsize=None)
+def _decode_elements(depth: int, mask: int) -> t.Tuple[TreeElements, ...]:
+    # bit `i` of the mask is set when the ancestor at the level `i` is the last entry of its directory,
+    # bit `depth` when the entry itself is
+    ancestors = (TreeElements.space if mask >> level & 1 else TreeElements.branch for level in range(depth))
+    return (*ancestors, TreeElements.last if mask >> depth & 1 else TreeElements.tee)
+
+
+@functools.lru_cache(maxsize=None)
+def _render_elements(depth: int, mask: int) -> str:
+    return "".join(e.value for e in _decode_elements(depth, mask))
+
+
+class IndexLines(t.Sequence[IndexLine]):
+    # tree lines as path ids into the table and depths with bitmasks instead of the elements
+    def __init__(self, root: Path, table: PathTable) -> None:
+        self.root = root
+        self.table = table
+        self.path_ids = array("I")
+        self.depths = array("I")
+        self.masks: t.List[int] = []
+
+    def __len__(self) -> int:
+        return len(self.path_ids)
+
+    @t.overload
+    def __getitem__(self, index: int) -> IndexLine:
+        ...  # pragma: no cover
+
+    @t.overload
+    def __getitem__(self, index: slice) -> t.List[IndexLine]:
+        ...  # pragma: no cover
+
+    def __getitem__(self, index: t.Union[int, slice]) -> t.Union[IndexLine, t.List[IndexLine]]:
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        elements = _decode_elements(self.depths[index], self.masks[index])
+        return IndexLine(elements, self.root / self.table.strings[self.path_ids[index]])
+
+    def append(self, path_id: int, depth: int, mask: int) -> None:
+        self.path_ids.append(path_id)
+        self.depths.append(depth)
+        self.masks.append(mask)
+
+    def render(self) -> t.Generator[str, None, None]:
+        strings = self.table.strings
+        for path_id, depth, mask in zip(self.path_ids, self.depths, self.masks):
+            yield _render_elements(depth, mask) + _render_relative_link(strings[path_id])
+
+    def to_data(self) -> t.Tuple[bytes, bytes, t.List[int]]:
+        return self.path_ids.tobytes(), self.depths.tobytes(), self.masks
+
+    @classmethod
+    def from_data(cls, root: Path, table: PathTable, data: t.Any) -> "IndexLines":
+        path_ids, depths, masks = data
+        lines = cls(root, table)
+        lines.path_ids.frombytes(path_ids)
+        lines.depths.frombytes(depths)
+        lines.masks = masks
+        if len(lines.path_ids) != len(masks) or len(lines.depths) != len(masks):
+            raise ValueError("Not index lines")
+        if lines.path_ids and max(lines.path_ids) >= len(table):
+            raise ValueError("Path id out of the table")
+        return lines
 
 
 @dataclass(frozen=True)
 class Index:
     root: Path
-    lines: t.Tuple[IndexLine, ...]
+    lines: t.Sequence[IndexLine]
     file_map: FileMap
     summary: Summary
 
     def __repr__(self) -> str:
+        import json
+
         return (
             f"{self.root.name if self.root else ''}\n"
             + "\n".join(repr(line) for line in (self.lines or []))
             + f"\n\n{json.dumps(dict((f.value, c) for f, c in (self.summary or {}).items()), sort_keys=True)}"  # noqa: C402
         )
 
+    def to_data(self) -> t.Tuple[t.Any, ...]:
+        file_map = t.cast(CompactFileMap, self.file_map)
+        lines = t.cast(IndexLines, self.lines)
+        summary = {file_format.value: count for file_format, count in self.summary.items()}
+        return str(self.root), file_map.table.to_data(), lines.to_data(), file_map.to_data(), summary
+
+    @classmethod
+    def from_data(cls, data: t.Any) -> "Index":
+        root, strings, lines, entries, summary = data
+        table = PathTable.from_data(strings)
+        return cls(
+            root=Path(root),
+            lines=IndexLines.from_data(Path(root), table, lines),
+            file_map=CompactFileMap.from_data(table, entries),
+            summary=defaultdict(int, {FileFormat(name): count for name, count in summary.items()}),
+        )
+
+
+def _walk_tree_lines(root: Path, list_dir: ListDir) -> t.Generator[t.Tuple[WalkEntry, int], None, None]:
+    # every entry with the bitmask of its tree line
+    mask = 0
+    for entry in walk_tree(root, list_dir):
+        depth = entry.depth
+        # the bits of the ancestors are left by the entries walked before
+        mask = mask & ((1 << depth) - 1) | entry.is_last << depth
+        yield entry, mask
+
+
+def _build_index(root: Path, lister: _DirectoryLister) -> Index:
+    table = PathTable()
+    lines = IndexLines(root, table)
+    file_map = CompactFileMap(table)
+    summary: Summary = defaultdict(int)
+    for entry, mask in _walk_tree_lines(root, lister.list_dir):
+        path_id = table.append(entry.relative)
+        lines.append(path_id, entry.depth, mask)
+        if entry.is_dir:
+            summary[FileFormat.directory] += 1
+        else:
+            for file_name in iterate_file_names(entry.relative):
+                file_map.add_id(file_name, path_id)
+            summary[FileFormat.from_path(entry.relative)] += 1  # type: ignore
+    return Index(root=root, lines=lines, file_map=file_map, summary=summary)
+
+
+_INDEX_SNAPSHOT_NAME = "index.bin"
+_VAULT_SNAPSHOT_NAME = "vault.bin"
+
+Facet = t.TypeVar("Facet")
+
+
+@dataclass(frozen=True)
+class TreeSnapshot:
+    root: Path
+    value: t.Any
+    listings: Listings
+
+    def to_data(self) -> t.Tuple[t.Any, ...]:
+        return str(self.root), self.value.to_data(), self.listings
+
+    @classmethod
+    def decoding(cls, decode_value: t.Callable[[t.Any], t.Any]) -> t.Callable[[t.Any], "TreeSnapshot"]:
+        def decode(data: t.Any) -> "TreeSnapshot":
+            root, value, listings = data
+            if not isinstance(listings, dict):
+                raise ValueError("Not directory listings")
+            return cls(root=Path(root), value=decode_value(value), listings=listings)
+
+        return decode
+
+
+def _is_fresh(root: Path, listings: Listings) -> bool:
+    # a directory's mtime changes whenever an entry is added, removed or renamed in it,
+    # so stat-ing the known directories is enough to detect any change of the tree
+    for key, (mtime_ns, _) in listings.items():
+        try:
+            if (root / key).stat().st_mtime_ns != mtime_ns:
+                return False
+        except OSError:
+            return False
+    return True
+
+
+def _scan_with_snapshot(
+    cache: Cache,
+    snapshot_name: str,
+    scan: t.Callable[[Path, _DirectoryLister], Facet],
+    from_data: t.Callable[[t.Any], Facet],
+) -> Facet:
+    root = Path(cache.get_value("vault_root"))
+    snapshot = load_snapshot(cache, snapshot_name, TreeSnapshot.decoding(from_data))
+    if snapshot is None or snapshot.root != root:
+        snapshot = None
+    elif _is_fresh(root, snapshot.listings):
+        return snapshot.value
+
+    lister = _DirectoryLister(root, known=snapshot.listings if snapshot else {})
+    value = scan(root, lister)
+    dump_snapshot(cache, snapshot_name, TreeSnapshot(root=root, value=value, listings=lister.listings).to_data())
+    return value
+
+
+@cached
+def scan_vault(cache: Cache) -> VaultScan:
+    return _scan_with_snapshot(cache, _VAULT_SNAPSHOT_NAME, _scan_vault, VaultScan.from_data)
+
+
+@cached
+def build_file_map(cache: Cache) -> FileMap:
+    return cache.get_value(scan_vault).file_map
+
+
+def relative_to_vault(path: Path, vault_root: Path) -> t.Optional[Path]:
+    try:
+        relative = path.relative_to(vault_root)
+    except ValueError:
+        return None
+    if any(is_hidden(part) for part in relative.parts):
+        return None
+    return relative
+
+
+def _iter_notes_under(notes: t.List[Path], directory: Path) -> t.Generator[Path, None, None]:
+    # sorted paths of a subtree are next to each other
+    depth = len(directory.parts)
+    for note in itertools.islice(notes, bisect.bisect_left(notes, directory), None):
+        if note.parts[:depth] != directory.parts:
+            return
+        yield note
+
+
+def expand_paths(cache: Cache, paths: t.Iterable[Path]) -> t.List[Path]:
+    # directories of the vault are taken from the vault scan, which the links need anyway
+    vault_root = Path(cache.get_value("vault_root")).resolve()
+    expanded = []
+    for path in paths:
+        directory = relative_to_vault(path.resolve(), vault_root) if path.is_dir() else None
+        if directory is None:
+            expanded.extend(expand_dir(path))
+            continue
+        notes = cache.get_value(scan_vault).notes
+        depth = len(directory.parts)
+        expanded.extend(path.joinpath(*note.parts[depth:]) for note in _iter_notes_under(notes, directory))
+    return expanded
+
 
 @cached
 def build_index(cache: Cache) -> Index:
-    dir_path = Path(cache.get_value("vault_root"))
-    summary = defaultdict(int)
-    file_map = defaultdict(list)
-
-    return Index(
-        root=dir_path,
-        lines=tuple(_walk_path_tree(dir_path, dir_path, summary, file_map)),
-        summary=summary,
-        file_map=file_map,
-    )
+    return _scan_with_snapshot(cache, _INDEX_SNAPSHOT_NAME, _build_index, Index.from_data)
 
 
 def render_doc_link(path: Path) -> str:
@@ -99,6 +381,14 @@ def render_doc_link(path: Path) -> str:
     return f"[{path.name}]({str(path)})"
 
 
+def _render_relative_link(relative: str) -> str:
+    # `render_doc_link` for a path kept as a string
+    name = relative.rsplit(os.sep, 1)[-1]
+    if " " in relative:
+        return f"[{name}](<{relative}>)"
+    return f"[{name}]({relative})"
+
+
 SUMMARY_TEMPLATE = """
 | File Format | Count |
 | :---        |  ---: |
@@ -131,9 +421,147 @@ def render_index_line(line: IndexLine, root: t.Optional[Path] = None) -> str:
     return "".join(e.value for e in line.elements) + render_doc_link(doc_link)
 
 
+def _render_lines(index: Index) -> t.Iterable[str]:
+    if isinstance(index.lines, IndexLines):
+        return index.lines.render()
+    return (render_index_line(line, index.root) for line in index.lines)
+
+
 def render_index(index: Index) -> str:
     return INDEX_TEMPLATE.format(
         dir_name=index.root.name,
-        rendered_index="\n".join(render_index_line(line, index.root) for line in index.lines),
+        rendered_index="\n".join(_render_lines(index)),
         rendered_summary=render_summary(index.summary),
     )
+
+
+def _excluding(excluded: t.Optional[Path]) -> ListDir:
+    if excluded is None:
+        return list_visible_entries
+
+    def list_dir(current: Path, relative: Path) -> Listing:
+        entries = list_visible_entries(current, relative)
+        if relative == excluded.parent:
+            entries = tuple(entry for entry in entries if entry[0] != excluded.name)
+        return entries
+
+    return list_dir
+
+
+# listing, rendered lines of the entries (without the prefix of the ancestors) and counts of their formats
+Fragment = t.Tuple[int, Listing, t.Tuple[str, ...], t.Dict[FileFormat, int]]
+Fragments = t.Dict[str, Fragment]
+
+
+# kept along with the vault root and the excluded index note, as strings
+FragmentsSnapshot = t.Tuple[str, t.Optional[str], Fragments]
+
+
+def _fragments_to_data(snapshot: FragmentsSnapshot) -> t.Tuple[t.Any, ...]:
+    root, excluded, fragments = snapshot
+    data = {
+        key: (mtime_ns, entries, lines, {file_format.value: count for file_format, count in counts.items()})
+        for key, (mtime_ns, entries, lines, counts) in fragments.items()
+    }
+    return root, excluded, data
+
+
+def _fragments_from_data(data: t.Any) -> FragmentsSnapshot:
+    root, excluded, fragments = data
+    return (
+        root,
+        excluded,
+        {
+            key: (mtime_ns, entries, lines, {FileFormat(name): count for name, count in counts.items()})
+            for key, (mtime_ns, entries, lines, counts) in fragments.items()
+        },
+    )
+
+
+_FRAGMENTS_SNAPSHOT_NAME = "index_fragments.bin"
+
+
+@dataclass
+class _IndexRenderer:
+    # Renders the index note directory by directory. A directory whose mtime hasn't changed since the fragments
+    # were kept has the same entries, so its lines are only spliced in under the prefix of its ancestors.
+    root: Path
+    excluded: t.Optional[Path] = None
+    known: Fragments = field(default_factory=dict)
+    fragments: Fragments = field(default_factory=dict)
+    rendered_dirs: int = 0
+    started_at_ns: int = field(default_factory=time.time_ns)
+
+    def fragment(self, current: Path, relative: Path) -> Fragment:
+        key = str(relative)
+        mtime_ns = current.stat().st_mtime_ns
+        fragment = self.known.get(key)
+        if not fragment or fragment[0] != mtime_ns:
+            self.rendered_dirs += 1
+            fragment = self._render(current, relative, trusted_mtime(mtime_ns, self.started_at_ns))
+        self.fragments[key] = fragment
+        return fragment
+
+    def _render(self, current: Path, relative: Path, mtime_ns: int) -> Fragment:
+        entries = tuple(sorted(_excluding(self.excluded)(current, relative)))
+        last = len(entries) - 1
+        lines = tuple(
+            _render_elements(0, i == last) + _render_relative_link(str(relative / name))
+            for i, (name, _) in enumerate(entries)
+        )
+        counts: t.Dict[FileFormat, int] = defaultdict(int)
+        for name, is_dir in entries:
+            counts[FileFormat.directory if is_dir else FileFormat.from_path(Path(name))] += 1
+        return mtime_ns, entries, lines, dict(counts)
+
+    def _frame(self, current: Path, relative: Path, prefix: str) -> t.Tuple[t.Any, ...]:
+        fragment = self.fragment(current, relative)
+        return current, relative, prefix, fragment, iter(range(len(fragment[1])))
+
+    def iter_chunks(self) -> t.Generator[str, None, None]:
+        head, _, tail = INDEX_TEMPLATE.partition("{rendered_index}")
+        yield head.format(dir_name=self.root.name)
+        summary: Summary = defaultdict(int)
+        separator = ""
+        stack = [self._frame(self.root, Path(), "")]
+        while stack:
+            current, relative, prefix, (_, entries, lines, counts), positions = stack[-1]
+            position = next(positions, None)
+            if position is None:
+                for file_format, count in counts.items():
+                    summary[file_format] += count
+                stack.pop()
+                continue
+            yield separator + prefix + lines[position]
+            separator = "\n"
+            name, is_dir = entries[position]
+            if is_dir:
+                extension = TreeElements.space if position == len(entries) - 1 else TreeElements.branch
+                stack.append(self._frame(current / name, relative / name, prefix + extension.value))
+        yield tail.format(rendered_summary=render_summary(summary))
+
+
+def iter_rendered_index(root: Path, excluded: t.Optional[Path] = None) -> t.Generator[str, None, None]:
+    # `render_index` of the tree, piece by piece as it's walked, with no `Index` kept in memory
+    return _IndexRenderer(root, excluded).iter_chunks()
+
+
+def render_index_to(root: Path, stream: t.TextIO, excluded: t.Optional[Path] = None) -> None:
+    for chunk in iter_rendered_index(root, excluded):
+        stream.write(chunk)
+
+
+def write_index(cache: Cache, output: Path, dry_run: bool = False) -> bool:
+    # the index doesn't list itself, so that writing it again gives the same contents
+    root = Path(cache.get_value("vault_root"))
+    excluded = relative_to_vault(output.resolve(), root.resolve())
+    key = (str(root), str(excluded) if excluded else None)
+    snapshot = load_snapshot(cache, _FRAGMENTS_SNAPSHOT_NAME, _fragments_from_data)
+    known = snapshot[2] if snapshot and snapshot[:2] == key else {}
+    renderer = _IndexRenderer(root, excluded, known)
+    changed = save_chunks(output, renderer.iter_chunks(), compare_only=dry_run)
+    if renderer.rendered_dirs or len(renderer.fragments) != len(known):
+        dump_snapshot(cache, _FRAGMENTS_SNAPSHOT_NAME, _fragments_to_data((*key, renderer.fragments)))
+    if changed and not dry_run:
+        flush_writes()
+    return changed
@@ -1,53 +1,207 @@
+import functools
+import itertools
+import os
 import re
+import time
 import typing as t
+from collections import OrderedDict
+from dataclasses import (
+    dataclass,
+    field,
+)
 from pathlib import Path
 
 from pca.packages.errors import (
     ErrorCatalog,
+    ExceptionWithCode,
     error_builder,
 )
 
-from .cache import Cache
+from .cache import (
+    Cache,
+    cached,
+)
 from .config import Config
 from .console import (
     color_diff,
     color_header,
 )
-from .errors import Errors
+from .errors import (
+    Errors,
+    Notifications,
+)
+from .file_records import (
+    FileRecord,
+    FileRecords,
+    content_digest,
+    get_file_records,
+    get_target_state,
+    record_key,
+)
 from .files import (
     FileFormat,
     ProcessedFile,
     diff_files,
+    iter_line_pairs,
+    map_file,
+    read_chunks,
     read_file,
+    replace_file,
     save_file,
+    stream_diff,
+    temporary_sibling,
+)
+from .index import (
+    FileMap,
+    add_to_file_map,
 )
-from .index import Index
 from .repository import (
-    Submodule,
+    SubmoduleTable,
     get_submodules,
 )
+from .run_stats import (
+    RunStats,
+    get_run_stats,
+)
+from .storage import trusted_mtime
 
+_STREAMING_THRESHOLD = 32 << 20
+_STREAM_CHUNK_SIZE = 1 << 20
 
-def process_file(path: Path, cache: Cache) -> None:
+
+def process_file(path: Path, cache: Cache, shown_as: t.Optional[Path] = None) -> None:
+    # the note is reported as `shown_as`, e.g. as given to a client of the server, which opens it as `path`
+    shown_as = shown_as or path
     process_file: ProcessedFile = cache.get_value("get_processed_file")
-    with process_file:
-        process_file.set(path)
-        original_text = read_file(path)
-        formatted_text = repair_links(original_text, cache)
-        if original_text != formatted_text:
-            if not cache.get_value("dry_run"):
+    run_stats: RunStats = cache.get_value(get_run_stats)
+    with process_file, run_stats.timing_file(shown_as):
+        process_file.set(shown_as)
+        errors: Errors = cache.get_value("get_errors")
+        file_records: t.Optional[FileRecords] = cache.get_value(get_file_records)
+        if file_records is not None:
+            with run_stats.phase("lookup"):
+                skip = file_records.lookup(path, cache.get_value("build_file_map"))
+            if skip:
+                # neither the note nor the targets of its links changed since a clean run
+                run_stats.skipped_files += 1
+                return
+        stat = _file_stat(path)
+        if stat:
+            with run_stats.phase("prescan"):
+                linkless = _prescan_linkless(path, stat, file_records)
+            if linkless:
+                run_stats.linkless_files += 1
+                return
+        if stat and stat.st_size > cache.get_value("streaming_threshold", _STREAMING_THRESHOLD):
+            with run_stats.phase("stream"):
+                _process_file_streaming(path, cache, shown_as)
+            return
+        with run_stats.phase("read"):
+            original_text = read_file(path)
+        errors_start = len(errors)
+        with run_stats.phase("rewrite"):
+            formatted_text = repair_links(original_text, cache)
+        if original_text == formatted_text:
+            if file_records is not None and stat and len(errors) == errors_start:
+                _record_clean_file(file_records, path, stat, original_text, cache)
+        elif not cache.get_value("dry_run"):
+            with run_stats.phase("save"):
                 save_file(path, formatted_text, make_backups=cache.get_value("make_backups"))
-            else:
-                _print(color_header(f"\n\nFile '{str(path)}' would be modified. Here's the diff:"))
+        else:
+            with run_stats.phase("diff"):
+                _print(color_header(f"\n\nFile '{str(shown_as)}' would be modified. Here's the diff:"))
                 diff = diff_files(original_text, formatted_text)
                 _print("\n".join(color_diff(diff)))
 
 
+def _file_stat(path: Path) -> t.Optional[os.stat_result]:
+    try:
+        return path.stat()
+    except OSError:
+        # let reading the file report the problem
+        return None
+
+
+def _prescan_linkless(path: Path, stat: os.stat_result, file_records: t.Optional[FileRecords]) -> bool:
+    # A note without a single "[[" has nothing to repair, so it's recorded as clean without being decoded.
+    with map_file(path) as mapped:
+        if mapped.find(_WIKILINK_OPENING) != -1:
+            return False
+        if file_records is not None:
+            record = FileRecord(
+                stat.st_size, trusted_mtime(stat.st_mtime_ns, time.time_ns()), content_digest(mapped), ()
+            )
+            file_records.add(record_key(path), record)
+    return True
+
+
+def _record_clean_file(file_records: FileRecords, path: Path, stat: os.stat_result, text: str, cache: Cache) -> None:
+    # the file was stat-ed before it was read, so a change in between makes the record miss, never lie;
+    # the digest is of the bytes on the disk, as lookups hash them, not of the decoded text
+    with map_file(path) as mapped:
+        digest = content_digest(mapped)
+    new_stat = path.stat()
+    if (new_stat.st_size, new_stat.st_mtime_ns) != (stat.st_size, stat.st_mtime_ns):
+        return
+    links = dict.fromkeys(split_link(contents)[0] for contents in iter_wikilinks(text))
+    record = FileRecord(
+        size=stat.st_size,
+        mtime_ns=trusted_mtime(stat.st_mtime_ns, time.time_ns()),
+        digest=digest,
+        targets=get_target_state(cache.get_value("build_file_map"), links),
+    )
+    file_records.add(record_key(path), record)
+
+
+def _process_file_streaming(path: Path, cache: Cache, shown_as: Path) -> None:
+    rewriter: LinkRewriter = cache.get_value(get_link_rewriter)
+    errors: Errors = cache.get_value("get_errors")
+    chunks = read_chunks(path, cache.get_value("stream_chunk_size", _STREAM_CHUNK_SIZE))
+    segments = rewriter.rewrite_segments(chunks, errors, shown_as)
+    if cache.get_value("dry_run"):
+        diff = stream_diff(iter_line_pairs(segments))
+        if (first_line := next(diff, None)) is not None:
+            _print(color_header(f"\n\nFile '{str(shown_as)}' would be modified. Here's the diff:"))
+            for line in color_diff(itertools.chain((first_line,), diff)):
+                _print(line)
+        return
+
+    changed = False
+    with temporary_sibling(path) as f:
+        for original, formatted in segments:
+            changed = changed or original != formatted
+            f.write(formatted)
+    if changed:
+        replace_file(path, Path(f.name), make_backups=cache.get_value("make_backups"))
+    else:
+        os.unlink(f.name)
+
+
 def _print(text: str) -> None:  # pragma: no cover
     print(text)
 
 
 _WIKILINK_STRUCTURE = re.compile(r"\[\[(.*?)\]\]")
+# Links in code and frontmatter are quoted, not followed, so they're left alone. The patterns below start with
+# a literal, which the regex engine skips ahead to as fast as to the "[[" of a link; a single alternation of them
+# all would be tried at every position instead, several times slower.
+_FENCE_CHARS = re.compile(r"```|~~~")
+# the line of an opening fence, within blockquotes and list items
+_FENCE_OPENING = re.compile(
+    r"(?P<quote>(?:[ ]{0,3}>[ ]?)*)(?P<indent>[ ]*)(?P<items>(?:(?:[-+*]|\d{1,9}[.)])[ ]{1,4})*)"
+    r"(?P<fence>`{3,}|~{3,})(?P<info>[^\n]*)"
+)
+_QUOTE = re.compile(r"(?:[ ]{0,3}>[ ]?)*")
+_LIST_ITEM = re.compile(r"[ ]*(?:[-+*]|\d{1,9}[.)])[ ]{1,4}(?=\S)")
+# spans of up to three backticks, which don't reach past their line here
+_INLINE_CODE = re.compile(r"`(?:[^`\n]+`(?!`)|`(?:[^`\n]|`(?!`))+?``(?!`)|``(?:[^`\n]|`(?!``))+?```(?!`))")
+_FRONTMATTER_START = re.compile(r"---[ \t]*(?:\n|\Z)")
+_FRONTMATTER_CLOSE = re.compile(r"\n---[ \t]*(?:\n|\Z)")
+# a frontmatter closed further than that isn't looked for, nor kept whole by the streaming rewrite
+_FRONTMATTER_LIMIT = 1 << 16
+# the most of the lines before a segment the streaming rewrite keeps, for a fence in a list item to look back at
+_LIST_CONTEXT_LIMIT = 1 << 16
+_WIKILINK_OPENING = b"[["
 _DEAD_LINK_SIGN = " ❌"
 _AMBIGUOUS_LINK_SIGN = " 🟡"
 
@@ -57,78 +211,440 @@ class LinksErrors(ErrorCatalog):
     AmbiguousLink = error_builder()
 
 
+@dataclass
+class ResolutionStats:
+    hits: int = 0
+    misses: int = 0
+
+    @property
+    def hit_rate(self) -> float:
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    def __sub__(self, other: "ResolutionStats") -> "ResolutionStats":
+        return ResolutionStats(hits=self.hits - other.hits, misses=self.misses - other.misses)
+
+    def add(self, other: "ResolutionStats") -> None:
+        self.hits += other.hits
+        self.misses += other.misses
+
+
+class _Resolution(t.NamedTuple):
+    text: str
+    link: str
+    title: t.Optional[str]
+    error_class: t.Optional[t.Type[ExceptionWithCode]] = None
+    error_kwargs: t.Optional[t.Dict[str, t.Any]] = None
+
+
+_RESOLUTION_CACHE_SIZE = 8192
+
+
+@dataclass
+class LinkRewriter:
+    file_map: FileMap
+    vault_root: Path
+    submodules: SubmoduleTable
+    config: Config
+    prefix: str = ""
+    resolution_cache_size: int = _RESOLUTION_CACHE_SIZE
+    stats: ResolutionStats = field(default_factory=ResolutionStats)
+    _resolutions: t.Dict[str, _Resolution] = field(default_factory=OrderedDict, init=False, repr=False)
+    # documents for dead links, relative to the vault root; they're written in one batch at the end of the run
+    # and only then join the file map, until then the links resolve to them through a map of their own
+    _autogenerated: t.Dict[Path, None] = field(default_factory=dict, init=False, repr=False)
+    _autogenerated_map: FileMap = field(default_factory=dict, init=False, repr=False)
+
+    @classmethod
+    def from_cache(cls, cache: Cache) -> "LinkRewriter":
+        return cls(
+            file_map=cache.get_value("build_file_map"),
+            vault_root=cache.get_value("vault_root"),
+            submodules=cache.get_value(get_submodules),
+            config=cache.get_value("get_config"),
+            prefix=cache.get_value("link_prefix", ""),
+        )
+
+    def rewrite(
+        self,
+        text: str,
+        filepath: t.Optional[Path] = None,
+        errors: t.Optional[Errors] = None,
+        at_start: bool = True,
+    ) -> t.Tuple[str, Errors]:
+        errors = [] if errors is None else errors
+        return self._rewrite(text, filepath, errors, at_start, None)[0], errors
+
+    def rewrite_segments(
+        self, chunks: t.Iterable[str], errors: Errors, filepath: t.Optional[Path] = None
+    ) -> t.Generator[t.Tuple[str, str], None, None]:
+        # Yields (original, rewritten) segments of whole lines, as neither a wikilink nor an inline code span
+        # reaches past its line. A fenced block still open at the end of a segment is carried over to the next one,
+        # so that an unclosed fence doesn't keep the rest of the note in memory; the lines a fence in a list item
+        # may need to look back at are carried over too.
+        pending: t.List[str] = []
+        context = ""
+        fence_end: t.Optional[_FenceEnd] = None
+        at_start = True
+        for chunk in chunks:
+            pending.append(chunk)
+            if "\n" not in chunk:
+                continue
+            buffer = "".join(pending)
+            cut = buffer.rfind("\n") + 1
+            if at_start and _frontmatter_pending(buffer, cut):
+                pending = [buffer]
+                continue
+            segment = buffer[:cut]
+            pending = [buffer[cut:]]
+            text = context + segment
+            rewritten, fence_end = self._rewrite(text, filepath, errors, at_start, fence_end, len(context))
+            yield segment, rewritten
+            context = text[_list_context_start(text) :]
+            at_start = False
+        buffer = "".join(pending)
+        if buffer:
+            text = context + buffer
+            yield buffer, self._rewrite(text, filepath, errors, at_start, fence_end, len(context))[0]
+
+    def substitute(self, contents: str, errors: Errors, filepath: t.Optional[Path] = None) -> str:
+        resolution = self._resolve(contents)
+        if resolution.error_class is None:
+            return resolution.text
+        if resolution.error_class is LinksErrors.DeadLink and (path := self._request_document(resolution.link)):
+            return self._render_link(resolution.link, resolution.title, path)
+        errors.append(resolution.error_class(**resolution.error_kwargs, file=str(filepath)))
+        return resolution.text
+
+    def invalidate(self) -> None:
+        # to be called whenever the file map changes
+        self._resolutions.clear()
+
+    def add_autogenerated(self, paths: t.Iterable[Path]) -> None:
+        # requested by the dead links of the notes processed elsewhere, eg. by a parallel job
+        added = False
+        for path in paths:
+            if path not in self._autogenerated:
+                self._autogenerated[path] = None
+                add_to_file_map(self._autogenerated_map, path)
+                added = True
+        if added:
+            self.invalidate()
+
+    def take_autogenerated(self) -> t.List[Path]:
+        paths = list(self._autogenerated)
+        if paths:
+            self._autogenerated.clear()
+            self._autogenerated_map.clear()
+            self.invalidate()
+        return paths
+
+    def _rewrite(
+        self,
+        text: str,
+        filepath: t.Optional[Path],
+        errors: Errors,
+        at_start: bool,
+        fence_end: t.Optional["_FenceEnd"],
+        start: int = 0,
+    ) -> t.Tuple[str, t.Optional["_FenceEnd"]]:
+        # Rewrites the text from `start`, the lines before are only looked at. Also returns the fenced block
+        # still open at the end of the text.
+        substitute = self.substitute
+
+        def replace(match: t.Match[str]) -> str:
+            return substitute(match.group(1), errors, filepath)
+
+        if fence_end is None and not _may_have_code(text, at_start):
+            return _WIKILINK_STRUCTURE.sub(replace, text[start:] if start else text), None
+        pieces, fence_end = _split_pieces(text, at_start, fence_end, start)
+        rewritten = []
+        for piece_start, piece_end, protected in pieces:
+            piece = text[piece_start:piece_end]
+            rewritten.append(piece if protected else _WIKILINK_STRUCTURE.sub(replace, piece))
+        return "".join(rewritten), fence_end
+
+    def _resolve(self, contents: str) -> _Resolution:
+        resolutions = self._resolutions
+        resolution = resolutions.get(contents)
+        if resolution is not None:
+            self.stats.hits += 1
+            resolutions.move_to_end(contents)  # type: ignore
+            return resolution
+        self.stats.misses += 1
+        resolution = resolutions[contents] = self._resolve_uncached(contents)
+        if len(resolutions) > self.resolution_cache_size:
+            resolutions.popitem(last=False)  # type: ignore
+        return resolution
+
+    def _resolve_uncached(self, contents: str) -> _Resolution:
+        link, title = split_link(contents)
+        paths = self.file_map.get(link, None) or self._autogenerated_map.get(link, None)
+        if not paths:
+            return _Resolution(
+                f"[[{contents}|{title or link}{_DEAD_LINK_SIGN}]]",
+                link,
+                title,
+                LinksErrors.DeadLink,
+                {"target": link, "title": title},
+            )
+        elif len(paths) > 1:
+            return _Resolution(
+                f"[[{contents}|{title or link}{_AMBIGUOUS_LINK_SIGN}]]",
+                link,
+                title,
+                LinksErrors.AmbiguousLink,
+                {"target": link, "target_files": [str(p) for p in paths]},
+            )
+        return _Resolution(self._render_link(link, title, paths[0]), link, title)
+
+    def _render_link(self, link: str, title: t.Optional[str], path: Path) -> str:
+        prefix = self.prefix
+        bracket_l = bracket_r = ""
+        path_str = str(path)
+        if " " in path_str or " " in prefix:
+            bracket_l = "<"
+            bracket_r = ">"
+        if title is None:
+            title = link
+        title = _clean_good_title(title)
+        url = self.submodules.substitute(path) or f"{prefix}/{path}"
+        return f"[{title}]({bracket_l}{url}{bracket_r})"
+
+    def _request_document(self, link: str) -> t.Optional[Path]:
+        # The later links to the document resolve to it at once, and it's written only once, however many notes
+        # link to it.
+        if (
+            link
+            and (autogenerate_dir := self.config.links.autogenerate_dir)
+            and FileFormat.from_link(link) == FileFormat.markdown
+        ):
+            path = Path(autogenerate_dir) / f"{link}.md"
+            self.add_autogenerated((path,))
+            return path
+        return None
+
+
+@cached
+def get_link_rewriter(cache: Cache) -> LinkRewriter:
+    return LinkRewriter.from_cache(cache)
+
+
+def write_autogenerated_documents(
+    cache: Cache, paths: t.Iterable[Path], shown_root: t.Optional[Path] = None
+) -> t.List[Path]:
+    # Returns the files written; one created by somebody else since the vault was scanned is left alone. Either
+    # way the documents join the file map, unless it's a dry run. They're reported under `shown_root`, if given.
+    config: Config = cache.get_value("get_config")
+    notifications: Notifications = cache.get_value("get_notifications")
+    file_map: FileMap = cache.get_value("build_file_map")
+    vault_root = Path(cache.get_value("vault_root"))
+    written = []
+    for path in paths:
+        filepath = vault_root / path
+        shown_as = (shown_root or vault_root) / path
+        if cache.get_value("dry_run"):
+            notifications.append(f"File would be autogenerated: {str(shown_as)}")
+            continue
+        if not filepath.exists():
+            save_file(filepath, config.links.autogenerate_template or _AUTOGENERATED_DOCUMENT_TEMPLATE)
+            notifications.append(f"File autogenerated: {str(shown_as)}")
+            written.append(filepath)
+        add_to_file_map(file_map, path)
+        cache.get_value(get_link_rewriter).invalidate()
+    return written
+
+
 def repair_links(contents: str, cache: Cache) -> str:
-    # TODO differentiate special parts of document
-    return _WIKILINK_STRUCTURE.sub(lambda m: substitute_wikilink_format(m.group(1), cache), contents)
+    rewriter: LinkRewriter = cache.get_value(get_link_rewriter)
+    processed_file: ProcessedFile = cache.get_value("get_processed_file")
+    formatted, errors = rewriter.rewrite(contents, processed_file.filepath)
+    cache.get_value("get_errors").extend(errors)
+    return formatted
 
 
 def substitute_wikilink_format(contents: str, cache: Cache) -> str:
-    index: Index = cache.get_value("build_index")
-    prefix: str = cache.get_value("link_prefix", "")
-    errors: Errors = cache.get_value("get_errors")
+    rewriter: LinkRewriter = cache.get_value(get_link_rewriter)
     processed_file: ProcessedFile = cache.get_value("get_processed_file")
-    bracket_l = bracket_r = ""
+    return rewriter.substitute(contents, cache.get_value("get_errors"), processed_file.filepath)
 
-    link = contents.strip("[]")
-    if "|" in contents:
-        link, title = link.rsplit("|", 1)
-    else:
-        title = None
-    paths = index.file_map.get(link, None)
-    if not paths:
-        if not (path := _autogenerate_document_for_link(cache, link)):
-            errors.append(LinksErrors.DeadLink(target=link, title=title, file=str(processed_file.filepath)))
-            return f"[[{contents}|{title or link}{_DEAD_LINK_SIGN}]]"
-    elif len(paths) > 1:  # pragma: no cover
-        errors.append(
-            LinksErrors.AmbiguousLink(
-                target=link, target_files=[str(p) for p in paths], file=str(processed_file.filepath)
-            )
-        )
-        return f"[[{contents}|{title or link}{_AMBIGUOUS_LINK_SIGN}]]"
+
+_AUTOGENERATED_DOCUMENT_TEMPLATE = "<sub>This file was autogenerated.</sub>\n"
+
+
+def _may_have_code(text: str, at_start: bool) -> bool:
+    # or frontmatter; most notes have neither, and they're rewritten in one go
+    return "`" in text or "~~~" in text or at_start and text.startswith("---")
+
+
+def _frontmatter_end(text: str, end: int) -> int:
+    opening = _FRONTMATTER_START.match(text, 0, end)
+    if not opening:
+        return 0
+    # the newline of an empty frontmatter's opening line is the one before its closing line too
+    closing = _FRONTMATTER_CLOSE.search(text, opening.end() - 1, end)
+    return closing.end() if closing and closing.end() <= _FRONTMATTER_LIMIT else 0
+
+
+def _frontmatter_pending(text: str, end: int) -> bool:
+    # whether the frontmatter the text opens with may still be closed past its first `end` characters
+    return end < _FRONTMATTER_LIMIT and bool(_FRONTMATTER_START.match(text)) and not _frontmatter_end(text, end)
+
+
+class _FenceEnd(t.NamedTuple):
+    search: t.Pattern[str]
+    # for the first line of a text starting within the block, which has no newline before it
+    first_line: t.Pattern[str]
+
+
+@functools.lru_cache(maxsize=None)
+def _fence_end(char: str, length: int, column: int, depth: int) -> _FenceEnd:
+    # A fenced block is closed by a fence of its character, at least as long and indented by at most three spaces
+    # more than the content of its list item, or ended along with the blockquote or the list item it's in.
+    quote = rf"(?:[ ]{{0,3}}>[ ]?){{{depth}}}" if depth else ""
+    leaving = []
+    if depth:
+        leaving.append(rf"(?!{quote})")
+    if column:
+        leaving.append(rf"{quote}[ ]{{0,{column - 1}}}\S")
+    body = rf"(?P<close>{quote}[ ]{{{column},{column + 3}}}{re.escape(char)}{{{length},}}[ \t]*$)"
+    if leaving:
+        body += rf"|(?P<leave>{'|'.join(leaving)})"
+    return _FenceEnd(re.compile(rf"\n(?:{body})", re.MULTILINE), re.compile(body, re.MULTILINE))
+
+
+def _list_column(text: str, line_start: int, indent: int) -> int:
+    # the content column of the list item that an indented line belongs to, 0 outside of lists
+    end = line_start - 1
+    while indent and end >= 0:
+        start = text.rfind("\n", 0, end) + 1
+        line = text[start:end]
+        line = line[_QUOTE.match(line).end() :]  # type: ignore
+        content = line.lstrip(" ")
+        if content and len(line) - len(content) < indent:
+            item = _LIST_ITEM.match(line)
+            return item.end() if item and item.end() <= indent else 0
+        end = start - 1
+    return 0
+
+
+def _opening_fence_end(text: str, opening: t.Match[str]) -> t.Optional[_FenceEnd]:
+    fence = opening["fence"]
+    if fence[0] == "`" and "`" in opening["info"]:
+        # inline code
+        return None
+    indent = len(opening["indent"])
+    if opening["items"]:
+        column = indent + len(opening["items"])
     else:
-        path = paths[0]
-    path_str = str(path)
-    if " " in path_str or " " in prefix:
-        bracket_l = "<"
-        bracket_r = ">"
-    if title is None:
-        title = link
-    title = _clean_good_title(title)
-    url = _substitute_submodules(cache, path) or f"{prefix}/{path}"
-    return f"[{title}]({bracket_l}{url}{bracket_r})"
+        column = _list_column(text, opening.start(), indent)
+        if indent - column > 3:
+            return None
+    return _fence_end(fence[0], len(fence), column, opening["quote"].count(">"))
 
 
-def _substitute_submodules(cache: Cache, path: Path) -> t.Optional[str]:
-    submodules: t.Dict[Path, Submodule] = cache.get_value(get_submodules)
-    root: Path = cache.get_value("vault_root")
+def _next_fence(text: str, pos: int) -> t.Optional[t.Tuple[int, int, _FenceEnd]]:
+    # the start and the end of the opening line of the next fenced block, and how the block ends
+    while chars := _FENCE_CHARS.search(text, pos):
+        line_start = text.rfind("\n", 0, chars.start()) + 1
+        opening = _FENCE_OPENING.match(text, line_start)
+        if opening and opening.start("fence") == chars.start():
+            fence_end = _opening_fence_end(text, opening)
+            if fence_end:
+                return line_start, opening.end(), fence_end
+        pos = text.find("\n", chars.end())
+        if pos == -1:
+            break
+    return None
 
-    for submodule in submodules:
-        assert isinstance(submodule, Submodule)
-        if submodule.path in (root / path).parents:
-            return submodule.substitute(root / path)
-    return
 
+def _block_end(text: str, pos: int, fence_end: _FenceEnd, continued: bool = False) -> t.Optional[int]:
+    # None while the block may go on past the end of the text; a continued one goes on from the line at `pos`
+    match = fence_end.first_line.match(text, pos) if continued else None
+    match = match or fence_end.search.search(text, pos)
+    if match is None:
+        return None
+    if match["close"] is not None:
+        return match.end()
+    leave = match.start("leave")
+    return leave if leave < len(text) else None
 
-_AUTOGENERATED_DOCUMENT_TEMPLATE = "<sub>This file was autogenerated.</sub>\n"
 
+def _list_context_start(text: str) -> int:
+    # the start of the lines of a text that a fence after it may need to look back at, up to its last unindented one
+    end = len(text)
+    while end > 0:
+        start = text.rfind("\n", 0, end - 1) + 1
+        line = text[start:end]
+        line = line[_QUOTE.match(line).end() :]  # type: ignore
+        if line.strip() and not line.startswith(" ") or len(text) - start > _LIST_CONTEXT_LIMIT:
+            return start
+        end = start
+    return 0
 
-def _autogenerate_document_for_link(cache: Cache, link: str) -> t.Optional[Path]:
-    config: Config = cache.get_value("get_config")
-    notifications: list = cache.get_value("get_notifications")
-    if (
-        link
-        and (autogenerate_dir := config.links.autogenerate_dir)
-        and FileFormat.from_link(link) == FileFormat.markdown
-    ):
-        filepath: Path = cache.get_value("vault_root") / autogenerate_dir / f"{link}.md"
-        if cache.get_value("dry_run"):
-            notifications.append(f"File would be autogenerated: {str(filepath)}")
-        else:
-            contents = config.links.autogenerate_template or _AUTOGENERATED_DOCUMENT_TEMPLATE
-            save_file(filepath, contents)
-            notifications.append(f"File autogenerated: {str(filepath)}")
-        return filepath
+
+def _add_unprotected(pieces: t.List[t.Tuple[int, int, bool]], text: str, start: int, end: int) -> None:
+    # with its inline code protected
+    if text.find("`", start, end) != -1:
+        for code in _INLINE_CODE.finditer(text, start, end):
+            pieces.append((start, code.start(), False))
+            pieces.append((code.start(), code.end(), True))
+            start = code.end()
+    if start < end:
+        pieces.append((start, end, False))
+
+
+def _split_pieces(
+    text: str, at_start: bool, fence_end: t.Optional[_FenceEnd] = None, start: int = 0
+) -> t.Tuple[t.List[t.Tuple[int, int, bool]], t.Optional[_FenceEnd]]:
+    # (start, end, protected) pieces of the text from `start`, which is within the given fenced block, if any,
+    # along with the block still open at its end; frontmatter is only found at the start of the document
+    pieces: t.List[t.Tuple[int, int, bool]] = []
+    if fence_end is not None:
+        block_end = _block_end(text, start, fence_end, continued=True)
+        if block_end is None:
+            return [(start, len(text), True)], fence_end
+        pieces.append((start, block_end, True))
+        start = block_end
+    elif at_start and text.startswith("---"):
+        start = _frontmatter_end(text, len(text))
+        if start:
+            pieces.append((0, start, True))
+    while (opening := _next_fence(text, start)) is not None:
+        fence_start, line_end, fence_end = opening
+        _add_unprotected(pieces, text, start, fence_start)
+        block_end = _block_end(text, line_end, fence_end)
+        if block_end is None:
+            pieces.append((fence_start, len(text), True))
+            return pieces, fence_end
+        pieces.append((fence_start, block_end, True))
+        start = block_end
+    _add_unprotected(pieces, text, start, len(text))
+    return pieces, None
+
+
+def iter_wikilinks(text: str) -> t.Iterator[str]:
+    # contents of the wikilinks of a whole document, outside its code and frontmatter
+    if not _may_have_code(text, True):
+        yield from _WIKILINK_STRUCTURE.findall(text)
+        return
+    for start, end, protected in _split_pieces(text, True)[0]:
+        if not protected:
+            yield from _WIKILINK_STRUCTURE.findall(text, start, end)
+
+
+def split_link(contents: str) -> t.Tuple[str, t.Optional[str]]:
+    link = contents.strip("[]")
+    if "|" in contents:
+        link, title = link.rsplit("|", 1)
+        return link, title
+    return link, None
+
+
+def iter_link_targets(contents: str) -> t.Iterator[str]:
+    # the target is what Obsidian links to, even within a marked dead or ambiguous link
+    for link in iter_wikilinks(contents):
+        yield link.strip("[]").split("|", 1)[0]
 
 
 def _clean_good_title(title: str) -> str:
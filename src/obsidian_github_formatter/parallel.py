@@ -0,0 +1,182 @@
+import contextlib
+import dataclasses
+import io
+import os
+import sys
+import typing as t
+from dataclasses import dataclass
+from pathlib import Path
+
+from .cache import Cache
+from .console import init_console
+from .errors import (
+    Errors,
+    Notifications,
+    SerializedError,
+    deserialize_error,
+    serialize_error,
+)
+from .file_records import (
+    FileRecord,
+    FileRecords,
+    get_file_records,
+    records_from_data,
+    records_to_data,
+)
+from .files import flush_writes
+from .links import (
+    LinkRewriter,
+    ResolutionStats,
+    get_link_rewriter,
+    process_file,
+)
+from .run_stats import (
+    RunStats,
+    get_run_stats,
+)
+
+# Values computed once by the parent process and handed over to each of the workers.
+_SHARED_VALUES = (
+    "verbosity",
+    "vault_root",
+    "dry_run",
+    "make_backups",
+    "use_cache",
+    "link_prefix",
+    "build_file_map",
+    "get_config",
+    "get_repo_root",
+    "get_submodules",
+)
+# Computed eagerly in both modes, so that errors they report keep the same position in the output.
+_WARM_UP_VALUES = ("build_file_map", "get_config", "get_submodules")
+_MISSING = object()
+
+
+@dataclass(frozen=True)
+class FileResult:
+    output: str
+    errors: t.List[SerializedError]
+    notifications: Notifications
+    resolution_stats: ResolutionStats
+    file_records: t.Dict[str, FileRecord]
+    run_stats: RunStats
+    # documents to autogenerate, left for the parent to write once for all the jobs
+    autogenerated: t.List[Path]
+
+    def to_data(self) -> t.Tuple[t.Any, ...]:
+        return (
+            self.output,
+            self.errors,
+            self.notifications,
+            dataclasses.astuple(self.resolution_stats),
+            records_to_data(self.file_records),
+            dataclasses.astuple(self.run_stats),
+            [str(path) for path in self.autogenerated],
+        )
+
+    @classmethod
+    def from_data(cls, data: t.Any) -> "FileResult":
+        output, errors, notifications, resolution_stats, file_records, run_stats, autogenerated = data
+        return cls(
+            output=output,
+            errors=errors,
+            notifications=notifications,
+            resolution_stats=ResolutionStats(*resolution_stats),
+            file_records=records_from_data(file_records),
+            run_stats=RunStats(*run_stats),
+            autogenerated=[Path(path) for path in autogenerated],
+        )
+
+
+def get_shared_values(cache: Cache) -> t.Dict[str, t.Any]:
+    shared = {name: cache.get_value(name, _MISSING) for name in _SHARED_VALUES}
+    return {name: value for name, value in shared.items() if value is not _MISSING}
+
+
+def process_captured(filepaths: t.Iterable[Path], cache: Cache, cwd: t.Optional[Path] = None) -> FileResult:
+    # relative paths are opened from `cwd`, if given, and reported as they are
+    errors: Errors = cache.get_value("get_errors")
+    notifications: Notifications = cache.get_value("get_notifications")
+    rewriter: LinkRewriter = cache.get_value(get_link_rewriter)
+    file_records: t.Optional[FileRecords] = cache.get_value(get_file_records)
+    # the stats of these files only, the cache may outlive a single call
+    run_stats = RunStats()
+    cache.add_values(get_run_stats=run_stats)
+    errors_start, notifications_start = len(errors), len(notifications)
+    stats_start = dataclasses.replace(rewriter.stats)
+    # colorama wraps the real stream, not the one capturing the output
+    init_console()
+    output = io.StringIO()
+    with contextlib.redirect_stdout(output):
+        for path in filepaths:
+            if cwd is None:
+                process_file(path, cache)
+            else:
+                process_file(Path(os.path.normpath(cwd / path)), cache, shown_as=path)
+    return FileResult(
+        output=output.getvalue(),
+        errors=[serialize_error(e) for e in errors[errors_start:]],
+        notifications=notifications[notifications_start:],
+        resolution_stats=rewriter.stats - stats_start,
+        file_records=file_records.take_new() if file_records is not None else {},
+        run_stats=run_stats,
+        autogenerated=rewriter.take_autogenerated(),
+    )
+
+
+def merge_result(result: FileResult, cache: Cache, stats: ResolutionStats) -> None:
+    if result.output:
+        # the colors are stripped here when the output isn't a terminal, as in a run without jobs
+        init_console()
+        sys.stdout.write(result.output)
+    errors: Errors = cache.get_value("get_errors")
+    errors.extend(deserialize_error(e) for e in result.errors)
+    notifications: Notifications = cache.get_value("get_notifications")
+    notifications.extend(result.notifications)
+    stats.add(result.resolution_stats)
+    file_records: t.Optional[FileRecords] = cache.get_value(get_file_records)
+    if file_records is not None:
+        file_records.update(result.file_records)
+    run_stats: RunStats = cache.get_value(get_run_stats)
+    run_stats.add(result.run_stats)
+    if result.autogenerated:
+        rewriter: LinkRewriter = cache.get_value(get_link_rewriter)
+        rewriter.add_autogenerated(result.autogenerated)
+
+
+_worker_cache: t.Optional[Cache] = None
+
+
+def _init_worker(values: t.Dict[str, t.Any]) -> None:  # pragma: no cover
+    global _worker_cache
+    _worker_cache = Cache[t.Any](**values)
+
+
+def _process_in_worker(paths: t.List[Path]) -> FileResult:  # pragma: no cover
+    assert _worker_cache is not None
+    result = process_captured(paths, _worker_cache)
+    flush_writes()
+    return result
+
+
+def process_files(filepaths: t.Sequence[Path], cache: Cache, jobs: int = 1) -> None:
+    for name in _WARM_UP_VALUES:
+        cache.get_value(name)
+    if jobs <= 1 or len(filepaths) < 2:
+        for path in filepaths:
+            process_file(path, cache)
+        return
+
+    from concurrent.futures import ProcessPoolExecutor
+
+    rewriter: LinkRewriter = cache.get_value(get_link_rewriter)
+    # a worker takes a whole chunk, so that it may sync the written directories once per chunk
+    chunk_size = max(1, len(filepaths) // (jobs * 4))
+    chunks = [list(filepaths[i : i + chunk_size]) for i in range(0, len(filepaths), chunk_size)]
+    with ProcessPoolExecutor(
+        max_workers=jobs, initializer=_init_worker, initargs=(get_shared_values(cache),)
+    ) as executor:
+        # `map` yields in the order of submission, so merging keeps the output of a serial run
+        for result in executor.map(_process_in_worker, chunks):
+            merge_result(result, cache, rewriter.stats)
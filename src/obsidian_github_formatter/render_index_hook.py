@@ -0,0 +1,43 @@
+#!/usr/bin/env python
+import os
+from pathlib import Path
+
+import click
+
+from .cache import Cache
+from .console import color_header
+from .index import write_index
+
+
+@click.command()
+@click.help_option("--help", "-h")
+@click.version_option()
+@click.option("--dry-run", "-n", is_flag=True, help="Only tell whether the index would change.")
+@click.option(
+    "--root",
+    "-r",
+    type=click.Path(exists=True, dir_okay=True, file_okay=False),
+    default=Path(os.getcwd()),
+    help="Root of the vault (it may not be the same as root of the repo).",
+)
+@click.option("--no-cache", is_flag=True, help="Render every directory again, without the fragments of the last run.")
+@click.argument("output", type=click.Path(dir_okay=False), default="index.md")
+def main(dry_run: bool, root: str, no_cache: bool, output: str) -> int:  # pragma: no cover
+    """Writes an index note of the vault: the tree of its files and a summary of their formats.
+
+    The index is rendered piece by piece as the vault is walked, and OUTPUT is left untouched when it's up to date.
+    The lines of every directory are kept between runs, so only the directories changed since are listed again.
+    """
+    cache = Cache(vault_root=Path(root), use_cache=not no_cache)
+    changed = write_index(cache, Path(output), dry_run=dry_run)
+    if not changed:
+        print(f"{color_header('Up to date:')} {output}")
+    elif dry_run:
+        print(f"{color_header('Would be written:')} {output}")
+    else:
+        print(f"{color_header('Written:')} {output}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())  # type: ignore
@@ -1,4 +1,5 @@
 #!/usr/bin/env python
+import contextlib
 import os
 import typing as t
 from pathlib import Path
@@ -7,12 +8,35 @@ import click
 
 from .cache import Cache
 from .console import color_header
+from .environment import (
+    load_environment,
+    save_environment,
+)
 from .errors import (
     Errors,
     Notifications,
 )
-from .files import expand_dir
-from .links import process_file
+from .file_records import save_file_records
+from .files import flush_writes
+from .index import expand_paths
+from .links import (
+    LinkRewriter,
+    ResolutionStats,
+    get_link_rewriter,
+    write_autogenerated_documents,
+)
+from .parallel import (
+    merge_result,
+    process_files,
+)
+from .run_stats import (
+    RunStats,
+    get_run_stats,
+)
+from .storage import get_socket_path
+
+_SLOWEST_FILES_SHOWN = 10
+_SHORTEST_TIME_SHOWN = 0.0001
 
 
 @click.command()
@@ -21,6 +45,26 @@ from .links import process_file
 @click.option("--verbose", "-v", count=True, help="Set verbosity level.")
 @click.option("--dry-run", "-n", is_flag=True, help="Show what would be changed and do not modify any files.")
 @click.option("--make-backups", "-b", is_flag=True, help="Copies the backfile before changes are to be mmade.")
+@click.option("--no-cache", is_flag=True, help="Neither read nor write the vault index cache (`.ogf-cache`).")
+@click.option("--jobs", "-j", type=click.IntRange(min=1), default=1, help="Number of files processed in parallel.")
+@click.option(
+    "--changed-since",
+    metavar="REF",
+    help="Also process notes changed since the git REF and notes linking to files added or removed since then.",
+)
+@click.option(
+    "--server",
+    is_flag=True,
+    help="Keep the vault index in memory and serve other invocations over a local socket (in `.ogf-cache`).",
+)
+@click.option(
+    "--stats", "show_stats", is_flag=True, help="Show the time spent by phase, slowest files and link counts."
+)
+@click.option(
+    "--profile",
+    type=click.Path(dir_okay=False),
+    help="Dump cProfile stats of the run into the file (not including the work of the parallel jobs).",
+)
 @click.option(
     "--root",
     "-r",
@@ -30,7 +74,17 @@ from .links import process_file
 )
 @click.argument("filenames", nargs=-1, type=click.Path(exists=True))
 def main(
-    verbose: int, dry_run: bool, make_backups: bool, root: str, filenames: t.List[str]
+    verbose: int,
+    dry_run: bool,
+    make_backups: bool,
+    no_cache: bool,
+    jobs: int,
+    changed_since: t.Optional[str],
+    server: bool,
+    show_stats: bool,
+    profile: t.Optional[str],
+    root: str,
+    filenames: t.List[str],
 ) -> int:  # pragma: no cover
     """Repairs wikilinks -- changes [[link]] link format to [link](link).
 
@@ -41,24 +95,39 @@ def main(
 
     * Supports submodules: changes [[link]] to a link [link](https://github.com/.../raw/master/{filepath}), based on `.gitmodules` config file.
     """
-    filepaths = (Path(fn) for fn in filenames)
-    filepaths = [p for fp in filepaths for p in expand_dir(fp)]
     cache = Cache[t.Any](
         verbosity=verbose,
         vault_root=Path(root),
         dry_run=dry_run,
         make_backups=make_backups,
-        processed_files=filepaths,
+        use_cache=not no_cache,
     )
+    load_environment(cache)
+    filepaths = expand_paths(cache, [Path(fn) for fn in filenames])
+    cache.add_values(processed_files=filepaths)
+    if server:
+        from .server import serve
+
+        print(color_header(f"Serving the vault {root}..."))
+        try:
+            serve(cache)
+        except KeyboardInterrupt:
+            pass
+        _echo_errors(cache)
+        return 0
+    with _profiling(profile):
+        if changed_since:
+            from .changes import add_changed_notes
+
+            add_changed_notes(cache, filepaths, changed_since)
+        if verbose > 1:
+            _echo_vars(cache)
+        stats = _process(filepaths, cache, jobs)
     if verbose > 1:
-        _echo_vars(cache)
-    for filename in filepaths:
-        process_file(filename, cache)
-    errors: Errors = cache.get_value("get_errors")
-    if errors:
-        print(color_header("\nErrors:"))
-        for error in errors:
-            print(f"{error.code}: {', '.join(f'{k}={v}' for k, v in error.kwargs.items())}")
+        _echo_stats(stats)
+    if show_stats:
+        _echo_run_stats(cache, stats)
+    errors = _echo_errors(cache)
     notifications: Notifications = cache.get_value("get_notifications")
     if verbose > 0 and notifications:
         print(color_header("\nInfo:"))
@@ -66,6 +135,46 @@ def main(
     return 1 if errors else 0
 
 
+@contextlib.contextmanager
+def _profiling(output: t.Optional[str]) -> t.Iterator[None]:  # pragma: no cover
+    if not output:
+        yield
+        return
+    import cProfile
+
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        yield
+    finally:
+        profiler.disable()
+        profiler.dump_stats(output)
+
+
+def _process(filepaths: t.List[Path], cache: Cache, jobs: int) -> ResolutionStats:  # pragma: no cover
+    result = None
+    if (socket_path := get_socket_path(cache)) is not None and socket_path.exists():
+        # only a running server is worth importing the sockets for
+        from .server import forward_to_server
+
+        result = forward_to_server(cache, filepaths)
+    if result is not None:
+        stats = ResolutionStats()
+        merge_result(result, cache, stats)
+    else:
+        process_files(filepaths, cache, jobs=jobs)
+        rewriter: LinkRewriter = cache.get_value(get_link_rewriter)
+        run_stats: RunStats = cache.get_value(get_run_stats)
+        with run_stats.phase("autogenerate"):
+            write_autogenerated_documents(cache, rewriter.take_autogenerated())
+        with run_stats.phase("sync"):
+            flush_writes()
+        stats = rewriter.stats
+    save_file_records(cache)
+    save_environment(cache)
+    return stats
+
+
 def _echo_vars(cache: Cache) -> None:
     print(
         f"{color_header('Vault root:')} {cache.get_value('vault_root')} "
@@ -81,5 +190,41 @@ def _echo_vars(cache: Cache) -> None:
         print("\n".join(str(p) for p in processed_files))
 
 
+def _echo_errors(cache: Cache) -> Errors:
+    errors: Errors = cache.get_value("get_errors")
+    if errors:
+        print(color_header("\nErrors:"))
+        for error in errors:
+            print(f"{error.code}: {', '.join(f'{k}={v}' for k, v in error.kwargs.items())}")
+    return errors
+
+
+def _echo_stats(stats: ResolutionStats) -> None:
+    print(
+        f"{color_header('Link resolutions:')} {stats.hits + stats.misses} "
+        f"{color_header('Cache hits:')} {stats.hits} ({stats.hit_rate:.1%})"
+    )
+
+
+def _echo_run_stats(cache: Cache, stats: ResolutionStats) -> None:
+    run_stats: RunStats = cache.get_value(get_run_stats)
+    print(color_header("\nTime by phase:"))
+    times = {**cache.computation_times, **run_stats.phases}
+    for name, seconds in sorted(times.items(), key=lambda item: item[1], reverse=True):
+        if seconds < _SHORTEST_TIME_SHOWN:
+            break
+        print(f"  {name:<24} {seconds * 1000:>10.1f} ms")
+    print(color_header("Slowest files:"))
+    for path, seconds in run_stats.slowest_files(_SLOWEST_FILES_SHOWN):
+        print(f"  {seconds * 1000:>10.1f} ms  {path}")
+    codes = [e.code for e in cache.get_value("get_errors")]
+    print(
+        f"{color_header('Files:')} {len(run_stats.file_times)} "
+        f"(skipped as unchanged: {run_stats.skipped_files}, without links: {run_stats.linkless_files}) "
+        f"{color_header('Links:')} {stats.hits + stats.misses} "
+        f"(dead: {codes.count('DeadLink')}, ambiguous: {codes.count('AmbiguousLink')})"
+    )
+
+
 if __name__ == "__main__":
     raise SystemExit(main())  # type: ignore
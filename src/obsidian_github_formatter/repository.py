@@ -1,7 +1,13 @@
 import typing as t
-from configparser import ConfigParser
-from dataclasses import dataclass
-from pathlib import Path
+from dataclasses import (
+    dataclass,
+    field,
+)
+from functools import cached_property
+from pathlib import (
+    Path,
+    PurePath,
+)
 from re import search
 
 from .cache import (
@@ -25,8 +31,9 @@ class Submodule:
     name: str
     path: Path
     repo_url: str
+    ref: str = "master"
 
-    @property
+    @cached_property
     def repo(self) -> str:
         repo = search(r"github.com:([\w\.\_\-\/]+).git", self.repo_url)
         if not repo:
@@ -34,16 +41,80 @@ class Submodule:
         return repo.group(1)
 
     def substitute(self, filepath: Path) -> str:
-        relative_filepath = filepath.relative_to(self.path)
-        return _GITHUB_FILE_URL_PATTERN.format(repo=self.repo, ref="master", filepath=str(relative_filepath))
+        return self.url(filepath.relative_to(self.path))
+
+    def url(self, relative_filepath: PurePath) -> str:
+        return _GITHUB_FILE_URL_PATTERN.format(repo=self.repo, ref=self.ref, filepath=str(relative_filepath))
+
+
+@dataclass
+class _TrieNode:
+    children: t.Dict[str, "_TrieNode"] = field(default_factory=dict)
+    submodule: t.Optional[Submodule] = None
+
+
+# Submodules of the repo, looked up by a path relative to the vault root.
+class SubmoduleTable:
+    def __init__(self, submodules: t.Iterable[Submodule], vault_root: Path) -> None:
+        self.submodules = tuple(submodules)
+        self.vault_root = vault_root
+        self._trie = _TrieNode()
+        for submodule in self.submodules:
+            try:
+                parts = submodule.path.relative_to(vault_root).parts
+            except ValueError:
+                # outside of the vault, no link can point into it
+                continue
+            node = self._trie
+            for part in parts:
+                node = node.children.setdefault(part, _TrieNode())
+            node.submodule = submodule
+
+    def __repr__(self) -> str:
+        return f"SubmoduleTable({list(self.submodules)})"
+
+    def __iter__(self) -> t.Iterator[Submodule]:
+        return iter(self.submodules)
+
+    def __len__(self) -> int:
+        return len(self.submodules)
+
+    def to_data(self) -> t.Tuple[t.Any, ...]:
+        submodules = tuple((s.name, str(s.path), s.repo_url, s.ref) for s in self.submodules)
+        return submodules, str(self.vault_root)
+
+    @classmethod
+    def from_data(cls, data: t.Any) -> "SubmoduleTable":
+        submodules, vault_root = data
+        return cls((Submodule(name, Path(path), url, ref) for name, path, url, ref in submodules), Path(vault_root))
+
+    def substitute(self, path: PurePath) -> t.Optional[str]:
+        parts = path.parts
+        node = self._trie
+        found: t.Optional[Submodule] = None
+        found_depth = 0
+        # the last part is skipped: a link to the submodule's directory itself stays a vault link
+        for depth, part in enumerate(parts[:-1], start=1):
+            next_node = node.children.get(part)
+            if next_node is None:
+                break
+            node = next_node
+            if node.submodule is not None:
+                found, found_depth = node.submodule, depth
+        if found is None:
+            return None
+        return found.url(PurePath(*parts[found_depth:]))
 
 
 @cached
-def get_submodules(cache: Cache) -> t.List[Submodule]:
+def get_submodules(cache: Cache) -> SubmoduleTable:
     root = cache.get_value(get_repo_root)
+    vault_root = Path(cache.get_value("vault_root")).resolve()
     gitmodules_path = root / ".gitmodules"
     if not gitmodules_path.exists():
-        return []
+        return SubmoduleTable((), vault_root)
+    from configparser import ConfigParser
+
     config = ConfigParser()
     config.read(str(gitmodules_path))
     result = []
@@ -56,6 +127,7 @@ def get_submodules(cache: Cache) -> t.List[Submodule]:
                     name=submodule_name.group(1) if submodule_name else "",
                     path=submodule_path,
                     repo_url=section["url"],
+                    ref=section.get("branch", "master"),
                 )
             )
-    return result
+    return SubmoduleTable(result, vault_root)
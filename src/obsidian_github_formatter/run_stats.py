@@ -0,0 +1,50 @@
+import contextlib
+import time
+import typing as t
+from dataclasses import (
+    dataclass,
+    field,
+)
+from pathlib import Path
+
+from .cache import cached
+
+
+@dataclass
+class RunStats:
+    # seconds spent in each phase of processing the files and on each of the files
+    phases: t.Dict[str, float] = field(default_factory=dict)
+    file_times: t.Dict[str, float] = field(default_factory=dict)
+    skipped_files: int = 0
+    linkless_files: int = 0
+
+    @contextlib.contextmanager
+    def phase(self, name: str) -> t.Iterator[None]:
+        started_at = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases[name] = self.phases.get(name, 0.0) + time.perf_counter() - started_at
+
+    @contextlib.contextmanager
+    def timing_file(self, path: Path) -> t.Iterator[None]:
+        started_at = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.file_times[str(path)] = time.perf_counter() - started_at
+
+    def slowest_files(self, count: int) -> t.List[t.Tuple[str, float]]:
+        return sorted(self.file_times.items(), key=lambda item: item[1], reverse=True)[:count]
+
+    def add(self, other: "RunStats") -> None:
+        for name, seconds in other.phases.items():
+            self.phases[name] = self.phases.get(name, 0.0) + seconds
+        self.file_times.update(other.file_times)
+        self.skipped_files += other.skipped_files
+        self.linkless_files += other.linkless_files
+
+
+@cached
+def get_run_stats(_: t.Any) -> RunStats:
+    return RunStats()
@@ -0,0 +1,196 @@
+import dataclasses
+import marshal
+import os
+import socket
+import socketserver
+import struct
+import typing as t
+from dataclasses import dataclass
+from pathlib import Path
+
+from .cache import Cache
+from .config import get_config
+from .environment import (
+    Sources,
+    get_environment_sources,
+    sources_trusted,
+)
+from .errors import (
+    Errors,
+    Notifications,
+    SerializedError,
+    serialize_error,
+)
+from .file_records import get_file_records
+from .files import flush_writes
+from .links import (
+    get_link_rewriter,
+    write_autogenerated_documents,
+)
+from .parallel import (
+    FileResult,
+    get_shared_values,
+    process_captured,
+)
+from .repository import (
+    get_repo_root,
+    get_submodules,
+)
+from .storage import get_socket_path
+from .watch import VaultWatcher
+
+_LENGTH = struct.Struct(">Q")
+
+
+@dataclass(frozen=True)
+class ServerRequest:
+    # the paths as given to the client, relative ones to its working directory
+    cwd: Path
+    vault_root: Path
+    filepaths: t.List[Path]
+    dry_run: bool
+    make_backups: bool
+
+    def to_data(self) -> t.Tuple[t.Any, ...]:
+        filepaths = [str(path) for path in self.filepaths]
+        return str(self.cwd), str(self.vault_root), filepaths, self.dry_run, self.make_backups
+
+    @classmethod
+    def from_data(cls, data: t.Any) -> "ServerRequest":
+        cwd, vault_root, filepaths, dry_run, make_backups = data
+        return cls(Path(cwd), Path(vault_root), [Path(path) for path in filepaths], dry_run, make_backups)
+
+
+# Messages are plain data, as snapshots are, so that neither end runs code sent by the other.
+def send_message(sock: socket.socket, message: t.Any) -> None:
+    payload = marshal.dumps(message)
+    sock.sendall(_LENGTH.pack(len(payload)) + payload)
+
+
+def receive_message(sock: socket.socket) -> t.Any:
+    (length,) = _LENGTH.unpack(_receive_exactly(sock, _LENGTH.size))
+    return marshal.loads(_receive_exactly(sock, length))
+
+
+def _receive_exactly(sock: socket.socket, size: int) -> bytes:
+    chunks = []
+    while size:
+        chunk = sock.recv(min(size, 1 << 20))
+        if not chunk:
+            raise ConnectionError("Connection closed before the whole message was received")
+        chunks.append(chunk)
+        size -= len(chunk)
+    return b"".join(chunks)
+
+
+def forward_to_server(cache: Cache, filepaths: t.List[Path]) -> t.Optional[FileResult]:
+    socket_path = get_socket_path(cache)
+    if socket_path is None or not hasattr(socket, "AF_UNIX") or not socket_path.exists():
+        return None
+    request = ServerRequest(
+        cwd=Path.cwd(),
+        vault_root=Path(cache.get_value("vault_root")),
+        filepaths=filepaths,
+        dry_run=cache.get_value("dry_run"),
+        make_backups=cache.get_value("make_backups"),
+    )
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+            sock.connect(str(socket_path))
+            send_message(sock, request.to_data())
+            result = receive_message(sock)
+        return None if result is None else FileResult.from_data(result)
+    except (OSError, EOFError, ValueError, TypeError):
+        # no server behind a stale socket file or it went away: the caller does the work by itself
+        return None
+
+
+class VaultServer:
+    def __init__(self, cache: Cache) -> None:
+        self.cache = cache
+        self.vault_root = Path(cache.get_value("vault_root")).resolve()
+        errors: Errors = cache.get_value("get_errors")
+        errors_start = len(errors)
+        self.sources: Sources = cache.get_value(get_environment_sources)
+        self.watcher = VaultWatcher(cache)
+        self.shared = get_shared_values(cache)
+        # reported once by the values computed here, e.g. a broken config; a run without the server
+        # would report them every time
+        self.environment_errors: t.List[SerializedError] = [serialize_error(e) for e in errors[errors_start:]]
+        # the client persists the records it gets back, the server only keeps them in memory
+        self.file_records = cache.get_value(get_file_records)
+
+    def handle(self, request: ServerRequest) -> t.Optional[FileResult]:
+        if (request.cwd / request.vault_root).resolve() != self.vault_root:
+            return None
+        self._refresh_environment()
+        # only the directories are stat-ed, the file map doesn't depend on notes modified in place
+        self.watcher.sync()
+        request_cache = Cache[t.Any](
+            **{
+                **self.shared,
+                "build_file_map": self.watcher.file_map,
+                "get_file_records": self.file_records,
+                "dry_run": request.dry_run,
+                "make_backups": request.make_backups,
+            }
+        )
+        result = process_captured(request.filepaths, request_cache, cwd=request.cwd)
+        notifications: Notifications = request_cache.get_value("get_notifications")
+        notifications_start = len(notifications)
+        write_autogenerated_documents(request_cache, result.autogenerated, shown_root=request.vault_root)
+        flush_writes()
+        return dataclasses.replace(
+            result,
+            errors=self.environment_errors + result.errors,
+            notifications=result.notifications + notifications[notifications_start:],
+            autogenerated=[],
+        )
+
+    def _refresh_environment(self) -> None:
+        # the config and `.gitmodules` are read again once changed, as a run without the server would
+        cache = self.cache
+        cache.reset(get_environment_sources)
+        sources: Sources = cache.get_value(get_environment_sources)
+        if sources == self.sources and sources_trusted(sources):
+            return
+        self.sources = sources
+        errors: Errors = cache.get_value("get_errors")
+        errors_start = len(errors)
+        for function in (get_config, get_repo_root, get_submodules):
+            cache.reset(function)
+        self.watcher.rewriter = cache.get_value(get_link_rewriter)
+        self.shared = get_shared_values(cache)
+        self.environment_errors = [serialize_error(e) for e in errors[errors_start:]]
+
+
+class _RequestHandler(socketserver.BaseRequestHandler):  # pragma: no cover
+    server: "_UnixServer"
+
+    def handle(self) -> None:
+        request = ServerRequest.from_data(receive_message(self.request))
+        result = self.server.vault_server.handle(request)
+        send_message(self.request, None if result is None else result.to_data())
+
+
+class _UnixServer(socketserver.UnixStreamServer):  # pragma: no cover
+    def __init__(self, socket_path: Path, vault_server: VaultServer) -> None:
+        self.vault_server = vault_server
+        super().__init__(str(socket_path), _RequestHandler)
+
+
+def serve(cache: Cache) -> None:  # pragma: no cover
+    socket_path = get_socket_path(cache)
+    if socket_path is None or not hasattr(socket, "AF_UNIX"):
+        raise RuntimeError("Server mode needs Unix sockets and the vault cache directory enabled.")
+    vault_server = VaultServer(cache)
+    socket_path.parent.mkdir(exist_ok=True)
+    if socket_path.exists():
+        socket_path.unlink()
+    # requests are handled one by one, so the warm cache is never used concurrently
+    with _UnixServer(socket_path, vault_server) as server:
+        os.chmod(socket_path, 0o600)
+        try:
+            server.serve_forever()
+        finally:
+            socket_path.unlink(missing_ok=True)
@@ -0,0 +1,75 @@
+import marshal
+import os
+import typing as t
+from pathlib import Path
+
+from .cache import (
+    Cache,
+    cached,
+)
+
+CACHE_DIR_NAME = ".ogf-cache"
+_FORMAT_VERSION = 3
+_GITIGNORE_CONTENTS = "*\n"
+_SOCKET_FILE_NAME = "server.sock"
+
+# A file or directory modified this close to a scan could change again within the same mtime tick
+# (coarse timestamps on FAT, network shares etc.), so what was read isn't trusted next time.
+_RACY_MTIME_WINDOW_NS = 2_000_000_000
+UNTRUSTED_MTIME = -1
+
+
+@cached
+def get_cache_dir(cache: Cache) -> t.Optional[Path]:
+    if not cache.get_value("use_cache", False):
+        return None
+    return Path(cache.get_value("vault_root")) / CACHE_DIR_NAME
+
+
+def get_socket_path(cache: Cache) -> t.Optional[Path]:
+    # where a server of the vault listens, known without importing the server and its dependencies
+    cache_dir: t.Optional[Path] = cache.get_value(get_cache_dir)
+    return None if cache_dir is None else cache_dir / _SOCKET_FILE_NAME
+
+
+def trusted_mtime(mtime_ns: int, scan_started_at_ns: int) -> int:
+    return mtime_ns if mtime_ns <= scan_started_at_ns - _RACY_MTIME_WINDOW_NS else UNTRUSTED_MTIME
+
+
+Data = t.TypeVar("Data")
+
+
+def _as_is(payload: t.Any) -> t.Any:
+    return payload
+
+
+# Snapshots are kept in the working tree of the vault, where anybody may have committed one, so they hold plain
+# data only (strings, numbers, bytes, tuples, lists and dicts), which `marshal` reads without running any code.
+def load_snapshot(cache: Cache, name: str, decode: t.Callable[[t.Any], Data] = _as_is) -> t.Optional[Data]:
+    cache_dir: t.Optional[Path] = cache.get_value(get_cache_dir)
+    if cache_dir is None:
+        return None
+    try:
+        with open(cache_dir / name, "rb") as f:
+            version, payload = marshal.load(f)
+        return decode(payload) if version == _FORMAT_VERSION else None
+    except Exception:
+        # missing, truncated, malformed or written by an incompatible version: just rebuild
+        return None
+
+
+def dump_snapshot(cache: Cache, name: str, payload: t.Any) -> None:
+    cache_dir: t.Optional[Path] = cache.get_value(get_cache_dir)
+    if cache_dir is None:
+        return
+    try:
+        if not cache_dir.exists():
+            cache_dir.mkdir()
+            (cache_dir / ".gitignore").write_text(_GITIGNORE_CONTENTS)
+        # pre-commit runs several hook processes at once, so never expose a half-written file
+        temp_path = cache_dir / f"{name}.{os.getpid()}.tmp"
+        with open(temp_path, "wb") as f:
+            marshal.dump((_FORMAT_VERSION, payload), f)
+        os.replace(temp_path, cache_dir / name)
+    except OSError:  # pragma: no cover
+        pass
@@ -0,0 +1,185 @@
+import os
+import time
+import typing as t
+from dataclasses import (
+    dataclass,
+    field,
+)
+from pathlib import Path
+
+from .cache import Cache
+from .file_records import save_file_records
+from .files import (
+    FileFormat,
+    flush_writes,
+)
+from .index import (
+    FileMap,
+    add_to_file_map,
+    remove_from_file_map,
+)
+from .links import (
+    LinkRewriter,
+    get_link_rewriter,
+    process_file,
+    write_autogenerated_documents,
+)
+from .storage import trusted_mtime
+
+# relative path -> (mtime_ns, size)
+FileStates = t.Dict[Path, t.Tuple[int, int]]
+
+
+@dataclass
+class DirectoryState:
+    mtime_ns: int
+    files: t.Dict[str, t.Tuple[int, int]]
+    subdirectories: t.List[str]
+
+
+# relative path of a directory -> its state
+DirectoryStates = t.Dict[Path, DirectoryState]
+
+
+def _list_directory(path: Path, mtime_ns: int) -> DirectoryState:
+    state = DirectoryState(mtime_ns, {}, [])
+    try:
+        entries = list(os.scandir(path))
+    except OSError:  # pragma: no cover
+        # removed in the middle of the scan, the next one will notice
+        return state
+    for entry in entries:
+        if entry.name.startswith("."):
+            continue
+        elif entry.is_dir():
+            state.subdirectories.append(entry.name)
+        else:
+            try:
+                stat = entry.stat()
+            except OSError:  # pragma: no cover
+                continue
+            state.files[entry.name] = (stat.st_mtime_ns, stat.st_size)
+    return state
+
+
+def scan_directories(root: Path, previous: t.Optional[DirectoryStates] = None) -> DirectoryStates:
+    # Creating, deleting or renaming an entry changes the mtime of its directory, so the files of a directory
+    # with the same mtime as before are neither listed nor stat-ed again; the previous state is reused as is.
+    # A modification in place changes no directory, it takes a scan without the previous states to notice it.
+    previous = previous or {}
+    started_at_ns = time.time_ns()
+    states: DirectoryStates = {}
+    stack = [Path()]
+    while stack:
+        relative = stack.pop()
+        try:
+            mtime_ns = os.stat(root / relative).st_mtime_ns
+        except OSError:  # pragma: no cover
+            continue
+        state = previous.get(relative)
+        if state is None or state.mtime_ns != mtime_ns:
+            state = _list_directory(root / relative, trusted_mtime(mtime_ns, started_at_ns))
+        states[relative] = state
+        stack.extend(relative / name for name in state.subdirectories)
+    return states
+
+
+def scan_file_states(root: Path) -> FileStates:
+    return {
+        relative / name: file_state
+        for relative, state in scan_directories(root).items()
+        for name, file_state in state.files.items()
+    }
+
+
+def diff_directories(
+    previous: DirectoryStates, current: DirectoryStates
+) -> t.Tuple[t.Set[Path], t.Set[Path], t.Set[Path]]:
+    # created, deleted and modified files, only the directories listed again are compared
+    created, deleted, modified = set(), set(), set()
+    for relative, state in current.items():
+        old = previous.get(relative)
+        if old is state:
+            continue
+        old_files = old.files if old is not None else {}
+        for name, file_state in state.files.items():
+            if name not in old_files:
+                created.add(relative / name)
+            elif old_files[name] != file_state:
+                modified.add(relative / name)
+        deleted.update(relative / name for name in old_files.keys() - state.files.keys())
+    for relative in previous.keys() - current.keys():
+        deleted.update(relative / name for name in previous[relative].files)
+    return created, deleted, modified
+
+
+@dataclass
+class VaultWatcher:
+    cache: Cache
+    debounce: float = 0.3
+    clock: t.Callable[[], float] = time.monotonic
+    # seconds between scans that stat every file, to notice notes modified in place
+    full_scan_interval: float = 10.0
+    directories: DirectoryStates = field(init=False)
+    pending: t.Set[Path] = field(default_factory=set, init=False)
+    last_change_at: float = field(default=0.0, init=False)
+    last_full_scan_at: float = field(default=0.0, init=False)
+
+    def __post_init__(self) -> None:
+        self.root = Path(self.cache.get_value("vault_root"))
+        self.file_map: FileMap = self.cache.get_value("build_file_map")
+        self.rewriter: LinkRewriter = self.cache.get_value(get_link_rewriter)
+        self.directories = scan_directories(self.root)
+        self.last_full_scan_at = self.clock()
+
+    def poll(self) -> t.List[Path]:
+        full = self.clock() - self.last_full_scan_at >= self.full_scan_interval
+        if full:
+            self.last_full_scan_at = self.clock()
+        notes = self.sync(full=full)
+        if notes:
+            self.pending |= notes
+            self.last_change_at = self.clock()
+        if self.pending and self.clock() - self.last_change_at >= self.debounce:
+            return self.flush()
+        return []
+
+    def sync(self, full: bool = False) -> t.Set[Path]:
+        # Brings the file map up to date, returns the notes created or modified since the last sync.
+        # The file map only depends on the directories, notes modified in place are noticed by a full sync.
+        directories = scan_directories(self.root, None if full else self.directories)
+        created, deleted, modified = diff_directories(self.directories, directories)
+        self.directories = directories
+
+        # a rename is seen as a deletion and a creation, either way only these entries are touched
+        for path in deleted:
+            remove_from_file_map(self.file_map, path)
+        for path in created:
+            add_to_file_map(self.file_map, path)
+        if created or deleted:
+            self.rewriter.invalidate()
+
+        return {p for p in created | modified if FileFormat.from_path(p) == FileFormat.markdown}
+
+    def flush(self) -> t.List[Path]:
+        notes, self.pending = sorted(self.pending), set()
+        processed = []
+        for note in notes:
+            path = self.root / note
+            if not path.exists():
+                continue
+            process_file(path, self.cache)
+            processed.append(path)
+            self._ignore_own_write(note)
+        for path in write_autogenerated_documents(self.cache, self.rewriter.take_autogenerated()):
+            self._ignore_own_write(path.relative_to(self.root))
+        flush_writes()
+        save_file_records(self.cache)
+        return processed
+
+    def _ignore_own_write(self, note: Path) -> None:
+        # own writes must not trigger another round of processing
+        directory = self.directories.get(note.parent)
+        if directory is not None:
+            stat = (self.root / note).stat()
+            directory.files[note.name] = (stat.st_mtime_ns, stat.st_size)
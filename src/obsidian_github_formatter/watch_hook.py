@@ -0,0 +1,81 @@
+#!/usr/bin/env python
+import os
+import time
+import typing as t
+from pathlib import Path
+
+import click
+
+from .cache import Cache
+from .console import color_header
+from .errors import (
+    Errors,
+    Notifications,
+)
+from .watch import VaultWatcher
+
+
+@click.command()
+@click.help_option("--help", "-h")
+@click.version_option()
+@click.option("--verbose", "-v", count=True, help="Set verbosity level.")
+@click.option("--dry-run", "-n", is_flag=True, help="Show what would be changed and do not modify any files.")
+@click.option("--make-backups", "-b", is_flag=True, help="Copies the backfile before changes are to be mmade.")
+@click.option("--no-cache", is_flag=True, help="Neither read nor write the vault index cache (`.ogf-cache`).")
+@click.option("--interval", type=float, default=0.5, show_default=True, help="Seconds between polls of the vault.")
+@click.option(
+    "--debounce",
+    type=float,
+    default=0.3,
+    show_default=True,
+    help="Seconds without changes before saved notes are processed.",
+)
+@click.option(
+    "--root",
+    "-r",
+    type=click.Path(exists=True, dir_okay=True, file_okay=False),
+    default=Path(os.getcwd()),
+    help="Root of the vault (it may not be the same as root of the repo).",
+)
+def main(
+    verbose: int, dry_run: bool, make_backups: bool, no_cache: bool, interval: float, debounce: float, root: str
+) -> int:  # pragma: no cover
+    """Watches the vault and repairs wikilinks of notes as they are saved.
+
+    The vault index is built once and then updated with created, deleted and renamed files only.
+    """
+    cache = Cache[t.Any](
+        verbosity=verbose,
+        vault_root=Path(root),
+        dry_run=dry_run,
+        make_backups=make_backups,
+        use_cache=not no_cache,
+    )
+    watcher = VaultWatcher(cache, debounce=debounce)
+    print(color_header(f"Watching {root}..."))
+    try:
+        while True:
+            time.sleep(interval)
+            processed = watcher.poll()
+            if processed:
+                _report(cache, processed)
+    except KeyboardInterrupt:
+        return 0
+
+
+def _report(cache: Cache, processed: t.List[Path]) -> None:
+    if cache.get_value("verbosity") > 0:
+        print(f"{color_header('Processed:')} {', '.join(str(p) for p in processed)}")
+    errors: Errors = cache.get_value("get_errors")
+    for error in errors:
+        print(f"{error.code}: {', '.join(f'{k}={v}' for k, v in error.kwargs.items())}")
+    notifications: Notifications = cache.get_value("get_notifications")
+    if cache.get_value("verbosity") > 0 and notifications:
+        print("\n".join(notifications))
+    # the lists are shared with the link rewriter, so they're emptied in place
+    errors.clear()
+    notifications.clear()
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())  # type: ignore
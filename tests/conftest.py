@@ -1,3 +1,4 @@
+import shutil
 from pathlib import Path
 
 import pytest
@@ -37,5 +38,13 @@ def cache(index: Index) -> Cache:
         dry_run=False,
         make_backups=False,
         build_index=index,
+        build_file_map=index.file_map,
         processed_files=(Path("foo.md"),),
     )
+
+
+@pytest.fixture
+def vault(tmp_path: Path) -> Path:
+    vault_path = tmp_path / "showcase"
+    shutil.copytree(_test_stub_path, vault_path)
+    return vault_path
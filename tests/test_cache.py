@@ -0,0 +1,102 @@
+import threading
+import time
+import typing as t
+from pathlib import Path
+
+import pytest
+
+from obsidian_github_formatter.cache import Cache
+from obsidian_github_formatter.config import (
+    Config,
+    LinksConfig,
+)
+from obsidian_github_formatter.repository import (
+    get_repo_root,
+    get_submodules,
+)
+
+from . import _test_stub_path
+
+
+def test_functions_of_instance() -> None:
+    cache, other = Cache(), Cache()
+    cache.add_functions(answer=lambda _: 42)
+    assert cache.get_value("answer") == 42
+    assert other.get_value("answer", None) is None
+
+
+def test_replaced_value_drops_dependents(vault: Path) -> None:
+    cache = Cache(vault_root=_test_stub_path / "foo")
+    assert cache.get_value("get_config") == Config()
+    submodules = cache.get_value(get_submodules)
+    assert cache.get_value(get_repo_root) == _test_stub_path.resolve()
+
+    cache.add_values(vault_root=vault)
+    assert cache.get_value("get_config") == Config(links=LinksConfig(autogenerate_dir="bar"))
+    assert cache.get_value(get_submodules) is not submodules
+    assert cache.get_value(get_repo_root) == vault.parent.resolve()
+
+
+def test_reset_drops_dependents() -> None:
+    cache = Cache(base=1)
+    cache.add_functions(double=lambda c: c.get_value("base") * 2, quadruple=lambda c: c.get_value("double") * 2)
+    assert cache.get_value("quadruple") == 4
+    assert cache.reset("double")
+    assert not cache.has_value("quadruple")
+    cache.add_values(base=2)
+    assert cache.get_value("quadruple") == 8
+
+
+def test_reset_given_value(vault: Path) -> None:
+    cache = Cache(vault_root=vault)
+    cache.get_value("build_index")
+    cache.get_value(get_submodules)
+    assert cache.get_value("get_config") == Config(links=LinksConfig(autogenerate_dir="bar"))
+    assert cache.reset("vault_root")
+    assert not any(map(cache.has_value, ("vault_root", "build_index", "get_config", get_submodules)))
+    with pytest.raises(ValueError):
+        cache.reset("vault_root")
+    cache.add_values(vault_root=_test_stub_path / "foo")
+    assert cache.get_value("get_config") == Config()
+
+
+def test_computed_once() -> None:
+    calls = []
+    started = threading.Event()
+
+    def slow(_: t.Any) -> object:
+        calls.append(None)
+        started.wait(1)
+        return object()
+
+    cache = Cache()
+    cache.add_functions(slow=slow)
+    results: t.List[object] = []
+    threads = [threading.Thread(target=lambda: results.append(cache.get_value("slow"))) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    started.set()
+    for thread in threads:
+        thread.join()
+    assert len(calls) == 1
+    assert len(set(map(id, results))) == 1
+
+
+def test_ttl() -> None:
+    cache = Cache(ttl=0.01)
+    cache.add_functions(now=lambda _: time.monotonic())
+    now = cache.get_value("now")
+    assert cache.get_value("now") == now
+    time.sleep(0.02)
+    assert cache.get_value("now") > now
+
+
+def test_max_size() -> None:
+    cache = Cache(max_size=2, given=0)
+    for name in ("first", "second", "third"):
+        cache.add_functions(**{name: lambda _: object()})
+    first = cache.get_value("first")
+    cache.get_value("second")
+    assert cache.get_value("first") is first
+    cache.get_value("third")
+    assert [cache.has_value(name) for name in ("given", "first", "second", "third")] == [True, True, False, True]
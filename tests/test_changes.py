@@ -0,0 +1,86 @@
+import subprocess
+from pathlib import Path
+from unittest import mock
+
+import pytest
+
+from obsidian_github_formatter.backlinks import build_backlinks
+from obsidian_github_formatter.cache import Cache
+from obsidian_github_formatter.changes import (
+    add_changed_notes,
+    get_changed_notes,
+    parse_name_status,
+)
+
+
+def test_parse_name_status() -> None:
+    output = "M\0vault/foo.md\0R087\0vault/old name.md\0vault/new name.md\0D\0vault/bar.png\0"
+    assert parse_name_status(output) == [
+        ("M", (Path("vault/foo.md"),)),
+        ("R", (Path("vault/old name.md"), Path("vault/new name.md"))),
+        ("D", (Path("vault/bar.png"),)),
+    ]
+
+
+def test_backlinks(vault: Path) -> None:
+    backlinks = build_backlinks(Cache(vault_root=vault))
+    assert backlinks["bar_file"] == [Path("foo/foo.md")]
+    assert backlinks["quax"] == [Path("foo/foo.md")]
+    assert "bar_file.md" not in backlinks
+
+
+def test_backlinks_snapshot(vault: Path) -> None:
+    build_backlinks(Cache(vault_root=vault, use_cache=True))
+    (vault / "bar" / "bar_file.md").write_text("[[quax]]")
+
+    backlinks = build_backlinks(Cache(vault_root=vault, use_cache=True))
+    assert backlinks["quax"] == [Path("bar/bar_file.md"), Path("foo/foo.md")]
+
+
+@mock.patch("obsidian_github_formatter.changes._git_diff")
+def test_changed_notes(_git_diff: mock.MagicMock, vault: Path) -> None:
+    cache = Cache(vault_root=vault, get_repo_root=vault.parent)
+    _git_diff.return_value = "\0".join(
+        (
+            "M",
+            "showcase/bar/bar_file.md",
+            "A",
+            "showcase/bar/bar baz/quax.txt",
+            "D",
+            "showcase/foo/deleted.md",
+            "M",
+            "showcase/.ogf-config.yaml",
+            "M",
+            "elsewhere/note.md",
+            "",
+        )
+    )
+    assert get_changed_notes(cache, "HEAD~1") == [vault / "bar/bar_file.md"]
+    _git_diff.assert_called_once_with(vault.parent, "HEAD~1")
+
+
+@mock.patch("obsidian_github_formatter.changes._git_diff")
+def test_changed_notes_with_backlinks(_git_diff: mock.MagicMock, vault: Path) -> None:
+    cache = Cache(vault_root=vault, get_repo_root=vault.parent)
+    (vault / "bar" / "quax.md").write_text("")
+    _git_diff.return_value = "A\0showcase/bar/quax.md\0R100\0showcase/bar/bar_file.md\0showcase/bar/baz.md\0"
+    assert get_changed_notes(cache, "main") == [vault / "bar/quax.md", vault / "foo/foo.md"]
+
+
+@mock.patch("obsidian_github_formatter.changes._git_diff")
+def test_changed_notes_git_failure(_git_diff: mock.MagicMock, vault: Path) -> None:
+    cache = Cache(vault_root=vault, get_repo_root=vault.parent)
+    _git_diff.side_effect = subprocess.CalledProcessError(128, "git")
+    assert get_changed_notes(cache, "nonexistent") == []
+    assert [e.code for e in cache.get_value("get_errors")] == ["GitDiffFailed"]
+
+
+@mock.patch("obsidian_github_formatter.changes._git_diff")
+def test_add_changed_notes(_git_diff: mock.MagicMock, vault: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    cache = Cache(vault_root=vault, get_repo_root=vault.parent)
+    (vault / "bar" / "quax.md").write_text("")
+    _git_diff.return_value = "M\0showcase/bar/bar_file.md\0M\0showcase/bar/quax.md\0"
+    monkeypatch.chdir(vault)
+    filepaths = [Path("bar/bar_file.md")]
+    add_changed_notes(cache, filepaths, "HEAD")
+    assert filepaths == [Path("bar/bar_file.md"), vault / "bar/quax.md"]
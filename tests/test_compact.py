@@ -0,0 +1,66 @@
+import pickle
+from pathlib import Path
+
+import pytest
+
+from obsidian_github_formatter.compact import (
+    CompactFileMap,
+    PathList,
+    PathTable,
+)
+
+
+def test_path_table() -> None:
+    table = PathTable()
+    assert table.append(Path("a/b.md")) == 0
+    assert table.intern("c.md") == 1
+    assert table.intern(Path("a/b.md")) == 0
+    assert table.append("d.md") == 2
+    assert table.intern("d.md") == 2
+    assert table.path(0) is table.path(0) == Path("a/b.md")
+
+    restored = pickle.loads(pickle.dumps(table))
+    assert restored.strings == ["a/b.md", "c.md", "d.md"]
+    assert restored.intern("c.md") == 1
+    assert len(restored) == 3
+    assert PathTable.from_data(table.to_data()).strings == table.strings
+    with pytest.raises(ValueError):
+        PathTable.from_data(["a.md", 1])
+
+
+def test_path_list() -> None:
+    table = PathTable(["a.md", "b.md", "c.md"])
+    paths = PathList(table)
+    for path_id in (0, 2):
+        paths.append(path_id)
+    assert len(paths) == 2
+    assert paths[1] == Path("c.md")
+    assert paths[:1] == [Path("a.md")]
+    assert list(paths) == [Path("a.md"), Path("c.md")]
+    assert list(PathList.from_data(table, paths.to_data())) == list(paths)
+    with pytest.raises(ValueError):
+        PathList.from_data(PathTable(["a.md"]), paths.to_data())
+
+
+def test_compact_file_map() -> None:
+    file_map = CompactFileMap()
+    a, b = file_map.table.append("a/x.md"), file_map.table.append("b/x.md")
+    file_map.add_id("x", a)
+    file_map.add_id("x", b)
+    file_map.add_id("x.md", a)
+    file_map["y"] = [Path("y.md")]
+    file_map["z"] = []
+    assert file_map == {"x": [Path("a/x.md"), Path("b/x.md")], "x.md": [Path("a/x.md")], "y": [Path("y.md")], "z": []}
+    assert "x" in file_map
+    assert file_map.get("w", ()) == ()
+
+    file_map.add_id("x.md", file_map.table.append("c/x.md"))
+    assert file_map["x.md"] == [Path("a/x.md"), Path("c/x.md")]
+    del file_map["z"]
+    restored = pickle.loads(pickle.dumps(file_map))
+    assert restored == file_map
+    assert len(restored) == 3
+    assert repr(restored).startswith("CompactFileMap({'x': [")
+    assert CompactFileMap.from_data(file_map.table, file_map.to_data()) == file_map
+    with pytest.raises(ValueError):
+        CompactFileMap.from_data(file_map.table, {"x": "a/x.md"})
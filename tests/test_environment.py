@@ -0,0 +1,102 @@
+import os
+from pathlib import Path
+from unittest import mock
+
+import yaml
+
+from obsidian_github_formatter.cache import Cache
+from obsidian_github_formatter.config import (
+    Config,
+    LinksConfig,
+)
+from obsidian_github_formatter.environment import (
+    load_environment,
+    save_environment,
+)
+from obsidian_github_formatter.repository import Submodule
+
+_OLD_MTIME_NS = 1_577_836_800 * 10**9
+_GITMODULES = '[submodule "module"]\n\tpath = showcase/module\n\turl = git@github.com:foo/module.git\n'
+
+
+def _settle(*paths: Path) -> None:
+    for path in paths:
+        os.utime(path, ns=(_OLD_MTIME_NS, _OLD_MTIME_NS))
+
+
+def _run(vault: Path) -> Cache:
+    cache = Cache(vault_root=vault, use_cache=True)
+    load_environment(cache)
+    for name in ("get_config", "get_submodules", "get_repo_root"):
+        cache.get_value(name)
+    save_environment(cache)
+    return cache
+
+
+def test_environment_reused(vault: Path) -> None:
+    (vault.parent / ".gitmodules").write_text(_GITMODULES)
+    _settle(vault / ".ogf-config.yaml", vault.parent / ".gitmodules")
+    _run(vault)
+
+    cache = Cache(vault_root=vault, use_cache=True)
+    with mock.patch("obsidian_github_formatter.config._read") as _read:
+        assert load_environment(cache)
+        assert cache.get_value("get_config") == Config(links=LinksConfig(autogenerate_dir="bar"))
+        assert list(cache.get_value("get_submodules")) == [
+            Submodule(
+                name="module",
+                path=vault.parent.resolve() / "showcase" / "module",
+                repo_url="git@github.com:foo/module.git",
+            )
+        ]
+        assert cache.get_value("get_repo_root") == vault.parent.resolve()
+    _read.assert_not_called()
+
+
+def test_environment_keeps_values(vault: Path) -> None:
+    _settle(vault / ".ogf-config.yaml")
+    _run(vault)
+
+    cache = Cache(vault_root=vault, use_cache=True, get_config=Config())
+    assert load_environment(cache)
+    assert cache.get_value("get_config") == Config()
+
+
+def test_changed_config(vault: Path) -> None:
+    _settle(vault / ".ogf-config.yaml")
+    _run(vault)
+
+    (vault / ".ogf-config.yaml").write_text("links:\n  autogenerate_dir: baz/qux\n")
+    _settle(vault / ".ogf-config.yaml")
+    cache = Cache(vault_root=vault, use_cache=True)
+    assert not load_environment(cache)
+    assert cache.get_value("get_config") == Config(links=LinksConfig(autogenerate_dir="baz/qux"))
+
+
+def test_appearing_gitmodules(vault: Path) -> None:
+    _settle(vault / ".ogf-config.yaml")
+    _run(vault)
+
+    (vault.parent / ".gitmodules").write_text(_GITMODULES)
+    assert not load_environment(Cache(vault_root=vault, use_cache=True))
+
+
+def test_recently_modified_config(vault: Path) -> None:
+    # modified within the racy window: it could change again without changing its size or mtime
+    (vault / ".ogf-config.yaml").touch()
+    _run(vault)
+    assert not load_environment(Cache(vault_root=vault, use_cache=True))
+
+
+def test_invalid_config(vault: Path) -> None:
+    _settle(vault / ".ogf-config.yaml")
+    with mock.patch("obsidian_github_formatter.config._read", side_effect=yaml.YAMLError()):
+        cache = _run(vault)
+    assert cache.get_value("get_errors")[0].code == "ConfigFileSyntaxError"
+    assert not load_environment(Cache(vault_root=vault, use_cache=True))
+
+
+def test_without_cache(vault: Path) -> None:
+    _settle(vault / ".ogf-config.yaml")
+    _run(vault)
+    assert not load_environment(Cache(vault_root=vault, use_cache=False))
@@ -0,0 +1,102 @@
+import os
+from pathlib import Path
+
+import pytest
+
+from obsidian_github_formatter.cache import Cache
+from obsidian_github_formatter.config import (
+    Config,
+    LinksConfig,
+)
+from obsidian_github_formatter.file_records import (
+    FileRecord,
+    content_digest,
+    get_file_records,
+    get_target_state,
+    record_key,
+    save_file_records,
+)
+from obsidian_github_formatter.index import add_to_file_map
+from obsidian_github_formatter.links import process_file
+
+
+def _cache(vault: Path, config: Config = Config(), dry_run: bool = False) -> Cache:
+    return Cache(vault_root=vault, dry_run=dry_run, make_backups=False, use_cache=True, get_config=config)
+
+
+def _run(vault: Path, path: Path, config: Config = Config(), dry_run: bool = False) -> Cache:
+    cache = _cache(vault, config, dry_run)
+    process_file(path, cache)
+    save_file_records(cache)
+    return cache
+
+
+def test_clean_note_recorded(vault: Path) -> None:
+    note = vault / "clean.md"
+    note.write_text("no links here")
+    _run(vault, note)
+
+    cache = _cache(vault)
+    assert cache.get_value(get_file_records).lookup(note, cache.get_value("build_file_map"))
+
+
+def test_modified_note_not_recorded(vault: Path) -> None:
+    note = vault / "note.md"
+    note.write_text("[[bar_file]]")
+    _run(vault, note)
+    assert note.read_text() == "[bar_file](/bar/bar_file.md)"
+
+    cache = _cache(vault)
+    assert not cache.get_value(get_file_records).lookup(note, cache.get_value("build_file_map"))
+
+
+def test_dead_link_not_recorded(vault: Path) -> None:
+    note = vault / "dead.md"
+    note.write_text("[[missing|missing ❌]]")
+    cache = _run(vault, note, dry_run=True)
+    assert cache.get_value("get_errors")[0].code == "DeadLink"
+    assert cache.get_value(get_file_records).records == {}
+
+
+def test_appearing_target_invalidates(vault: Path) -> None:
+    note = vault / "clean.md"
+    note.write_text("no links here")
+    cache = _cache(vault)
+    file_map = cache.get_value("build_file_map")
+    file_records = cache.get_value(get_file_records)
+    stat = note.stat()
+    targets = get_target_state(file_map, ["missing"])
+    assert targets == (("missing", ()),)
+    file_records.add(
+        record_key(note), FileRecord(stat.st_size, stat.st_mtime_ns, content_digest(note.read_bytes()), targets)
+    )
+    assert file_records.lookup(note, file_map)
+
+    add_to_file_map(file_map, Path("missing.md"))
+    assert not file_records.lookup(note, file_map)
+
+
+@pytest.mark.parametrize("contents", [b"no links here", b"no links here\r\n`[[bar_file]]` in code\r\n"])
+def test_touched_note(vault: Path, contents: bytes) -> None:
+    note = vault / "clean.md"
+    note.write_bytes(contents)
+    _run(vault, note)
+    stat = note.stat()
+    os.utime(note, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+
+    cache = _cache(vault)
+    file_records = cache.get_value(get_file_records)
+    assert file_records.lookup(note, cache.get_value("build_file_map"))
+
+    note.write_text("no links there")
+    os.utime(note, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+    assert not file_records.lookup(note, cache.get_value("build_file_map"))
+
+
+def test_environment_change(vault: Path) -> None:
+    note = vault / "clean.md"
+    note.write_text("no links here")
+    _run(vault, note)
+
+    cache = _cache(vault, Config(links=LinksConfig(autogenerate_dir="bar")))
+    assert cache.get_value(get_file_records).records == {}
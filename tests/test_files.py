@@ -0,0 +1,164 @@
+import os
+from pathlib import Path
+from unittest import mock
+
+import pytest
+
+from obsidian_github_formatter.files import (
+    FileWriter,
+    diff_files,
+    expand_dir,
+    iter_line_pairs,
+    map_file,
+    stream_diff,
+    walk_tree,
+)
+
+_ORIGINAL = [f"line {i}" for i in range(30)]
+
+
+@pytest.mark.parametrize(
+    "changed",
+    [
+        (),
+        (0,),
+        (29,),
+        (3, 4, 5),
+        (2, 9),
+        (2, 10),
+        (2, 11),
+        (0, 10, 20, 29),
+    ],
+)
+def test_stream_diff(changed: tuple) -> None:
+    formatted = [f"{line}!" if i in changed else line for i, line in enumerate(_ORIGINAL)]
+    text_a, text_b = "\n".join(_ORIGINAL) + "\n", "\n".join(formatted) + "\n"
+    segments = zip(text_a.splitlines(True), text_b.splitlines(True))
+    assert list(stream_diff(iter_line_pairs(segments))) == list(diff_files(text_a, text_b))
+
+
+def test_iter_line_pairs() -> None:
+    segments = [("a\nb", "A\nb"), ("c\n", "c\n"), ("d", "D!")]
+    assert list(iter_line_pairs(segments)) == [("a", "A"), ("bc", "bc"), ("d", "D!")]
+
+
+def test_map_file(tmp_path: Path) -> None:
+    path = tmp_path / "note.md"
+    path.write_bytes(b"")
+    with map_file(path) as mapped:
+        assert mapped.find(b"[[") == -1
+    path.write_bytes("żółw [[link]]\r\n".encode())
+    with map_file(path) as mapped:
+        assert mapped.find(b"[[") == len("żółw ".encode())
+        assert mapped[:] == path.read_bytes()
+
+
+def test_walk_tree(tmp_path: Path) -> None:
+    for relative in ("b/c.md", "b/.hidden/d.md", "a b/e.md", "a.md", ".git/config"):
+        (tmp_path / relative).parent.mkdir(parents=True, exist_ok=True)
+        (tmp_path / relative).write_text("")
+    assert [(str(e.relative), e.is_dir, e.depth, e.is_last) for e in walk_tree(tmp_path)] == [
+        ("a b", True, 0, False),
+        ("a b/e.md", False, 1, True),
+        ("a.md", False, 0, False),
+        ("b", True, 0, True),
+        ("b/c.md", False, 1, True),
+    ]
+
+
+def test_expand_deep_dir(tmp_path: Path) -> None:
+    deepest = tmp_path.joinpath(*["d"] * 200)
+    deepest.mkdir(parents=True)
+    (deepest / "note.md").write_text("")
+    (deepest / "image.png").write_text("")
+    assert list(expand_dir(tmp_path)) == [deepest / "note.md"]
+    assert list(expand_dir(deepest / "image.png")) == [deepest / "image.png"]
+
+
+class TestFileWriter:
+    def test_save(self, tmp_path: Path) -> None:
+        writer = FileWriter()
+        path = tmp_path / "note.md"
+        assert writer.save(path, "foo\n")
+        assert path.read_text() == "foo\n"
+        os.chmod(path, 0o640)
+
+        assert writer.save(path, "bar\n")
+        assert path.read_text() == "bar\n"
+        assert path.stat().st_mode & 0o777 == 0o640
+        assert [p.name for p in tmp_path.iterdir()] == ["note.md"]
+
+    def test_save_unchanged(self, tmp_path: Path) -> None:
+        writer = FileWriter()
+        path = tmp_path / "note.md"
+        path.write_text("foo\n")
+        os.utime(path, ns=(0, 0))
+        assert not writer.save(path, "foo\n")
+        assert path.stat().st_mtime_ns == 0
+
+    def test_backup(self, tmp_path: Path) -> None:
+        writer = FileWriter()
+        path = tmp_path / "note.md"
+        path.write_text("old\n")
+        (tmp_path / "note.md.~").write_text("older\n")
+        writer.save(path, "new\n", make_backups=True)
+        assert path.read_text() == "new\n"
+        assert (tmp_path / "note.md.~").read_text() == "old\n"
+
+    def test_save_chunks(self, tmp_path: Path) -> None:
+        writer = FileWriter()
+        path = tmp_path / "index.md"
+        assert writer.save_chunks(path, ["abc\n", "def\n"])
+        inode = path.stat().st_ino
+        with mock.patch.object(writer, "temporary") as temporary:
+            assert not writer.save_chunks(path, ["ab", "c\nd", "ef\n"])
+        temporary.assert_not_called()
+        assert path.stat().st_ino == inode
+
+        for chunks in (["abc\n", "dXf\n"], ["abc\n"], ["abc\n", "def\n", "ghi"], []):
+            assert writer.save_chunks(path, chunks)
+            assert path.read_text() == "".join(chunks)
+        assert [p.name for p in tmp_path.iterdir()] == ["index.md"]
+
+    def test_save_chunks_compare_only(self, tmp_path: Path) -> None:
+        writer = FileWriter()
+        path = tmp_path / "index.md"
+        path.write_text("abc\n")
+        chunks = iter(["x", "y", "z"])
+        assert writer.save_chunks(path, chunks, compare_only=True)
+        assert list(chunks) == []
+        assert path.read_text() == "abc\n"
+        assert not writer.save_chunks(path, ["abc\n"], compare_only=True)
+
+    def test_save_symlinked(self, tmp_path: Path) -> None:
+        writer = FileWriter()
+        (tmp_path / "notes").mkdir()
+        target = tmp_path / "notes" / "note.md"
+        target.write_text("old\n")
+        link = tmp_path / "link.md"
+        link.symlink_to(Path("notes") / "note.md")
+        assert writer.save(link, "new\n")
+        assert link.is_symlink()
+        assert target.read_text() == "new\n"
+        assert sorted(p.name for p in (tmp_path / "notes").iterdir()) == ["note.md"]
+        assert writer._pending_dirs == {target.parent.resolve()}
+
+    def test_failed_write(self, tmp_path: Path) -> None:
+        writer = FileWriter()
+        path = tmp_path / "note.md"
+        path.write_text("old\n")
+        with pytest.raises(ValueError):
+            with writer.temporary(path) as f:
+                f.write("new")
+                raise ValueError()
+        assert [p.name for p in tmp_path.iterdir()] == ["note.md"]
+        assert path.read_text() == "old\n"
+
+    def test_flush(self, tmp_path: Path) -> None:
+        writer = FileWriter()
+        (tmp_path / "foo").mkdir()
+        for name in ("a.md", "b.md", "foo/c.md"):
+            writer.save(tmp_path / name, name)
+        assert writer._pending_dirs == {tmp_path, tmp_path / "foo"}
+        writer.flush()
+        assert writer._pending_dirs == set()
@@ -1,20 +1,29 @@
+import os
+import typing as t
 from collections import defaultdict
 from pathlib import Path
+from unittest import mock
 
 import pytest
 
+from obsidian_github_formatter.files import expand_dir
 from obsidian_github_formatter.index import (
     Cache,
     FileFormat,
+    FileMap,
     IndexLine,
 )
 from obsidian_github_formatter.index import TreeElements as TE
 from obsidian_github_formatter.index import (
+    build_file_map,
     build_index,
+    expand_paths,
+    iter_rendered_index,
     render_doc_link,
     render_index,
     render_index_line,
     render_summary,
+    write_index,
 )
 
 
@@ -138,8 +147,10 @@ def test_render_index(cache: Cache) -> None:
     assert actual == expected
 
 
-def test_file_map(cache: Cache) -> None:
-    assert build_index(cache).file_map == {
+@pytest.mark.parametrize("get_file_map", [lambda c: build_index(c).file_map, build_file_map])
+def test_file_map(get_file_map: t.Callable[[Cache], FileMap], cache: Cache) -> None:
+    cache.reset(build_file_map)
+    assert get_file_map(cache) == {
         "OTHER FOO": [Path("foo/OTHER FOO.md")],
         "OTHER FOO.md": [Path("foo/OTHER FOO.md")],
         "bar_file": [Path("bar/bar_file.md")],
@@ -151,3 +162,97 @@ def test_file_map(cache: Cache) -> None:
         "foo.md": [Path("bar/foo.md"), Path("foo/foo.md")],
         "other baz.png": [Path("bar/bar baz/other baz.png")],
     }
+
+
+class TestIndexSnapshot:
+    def test_reused_when_fresh(self, vault: Path) -> None:
+        index = build_index(Cache(vault_root=vault, use_cache=True))
+        # the snapshot is trusted only for directories older than the racy window
+        for path in (vault, *(p for p in vault.rglob("*") if p.is_dir())):
+            os.utime(path, ns=(0, 0))
+        build_index(Cache(vault_root=vault, use_cache=True))
+
+        with mock.patch("os.scandir") as scandir:
+            cached_index = build_index(Cache(vault_root=vault, use_cache=True))
+        scandir.assert_not_called()
+        assert repr(cached_index) == repr(index)
+        assert cached_index.file_map == index.file_map
+
+    def test_rebuilt_when_changed(self, vault: Path) -> None:
+        build_index(Cache(vault_root=vault, use_cache=True))
+        (vault / "foo" / "new note.md").write_text("")
+        (vault / "bar" / "foo.md").unlink()
+
+        index = build_index(Cache(vault_root=vault, use_cache=True))
+        assert index.file_map["new note"] == [Path("foo/new note.md")]
+        assert index.file_map["foo"] == [Path("foo/foo.md")]
+        assert index.summary[FileFormat.markdown] == 4
+
+    def test_file_map_rebuilt_when_changed(self, vault: Path) -> None:
+        assert "new note" not in build_file_map(Cache(vault_root=vault, use_cache=True))
+        (vault / "foo" / "new note.md").write_text("")
+
+        file_map = build_file_map(Cache(vault_root=vault, use_cache=True))
+        assert file_map["new note"] == [Path("foo/new note.md")]
+
+
+def test_expand_paths(vault: Path, tmp_path: Path) -> None:
+    (tmp_path / "outside").mkdir()
+    (tmp_path / "outside" / "note.md").write_text("")
+    cache = Cache(vault_root=vault)
+    paths = [vault, vault / "bar", vault / "foo" / "foo.md", tmp_path / "outside"]
+    expanded = expand_paths(cache, paths)
+    assert expanded == [p for path in paths for p in expand_dir(path)]
+    assert vault / "bar" / "bar_file.md" in expanded
+    assert tmp_path / "outside" / "note.md" in expanded
+
+    with mock.patch("os.scandir") as scandir:
+        # the vault was already scanned for the file map
+        assert expand_paths(cache, [vault / "foo"]) == [vault / "foo" / "OTHER FOO.md", vault / "foo" / "foo.md"]
+    scandir.assert_not_called()
+
+
+def test_index_lines(vault: Path) -> None:
+    index = build_index(Cache(vault_root=vault))
+    lines = list(index.lines)
+    assert index.lines[:2] == lines[:2]
+    assert lines[1] == IndexLine((TE.branch, TE.tee), vault / "bar" / "bar baz")
+    assert lines[-1] == IndexLine((TE.space, TE.last), vault / "submodule" / "example_image.svg")
+    assert list(index.lines.render()) == [render_index_line(line, vault) for line in lines]
+
+
+def test_iter_rendered_index(vault: Path) -> None:
+    assert "".join(iter_rendered_index(vault)) == render_index(build_index(Cache(vault_root=vault)))
+
+
+def test_write_index(vault: Path) -> None:
+    output = vault / "index.md"
+    expected = render_index(build_index(Cache(vault_root=vault)))
+    assert write_index(Cache(vault_root=vault), output, dry_run=True)
+    assert not output.exists()
+
+    assert write_index(Cache(vault_root=vault), output)
+    assert output.read_text() == expected
+    stat = output.stat()
+    assert not write_index(Cache(vault_root=vault), output)
+    assert output.stat().st_ino == stat.st_ino
+
+    (vault / "foo" / "new note.md").write_text("")
+    assert write_index(Cache(vault_root=vault), output)
+    assert "[new note.md](<foo/new note.md>)" in output.read_text()
+    assert [p.name for p in vault.iterdir() if p.name.startswith(".index.md")] == []
+
+
+def test_write_index_reuses_fragments(vault: Path) -> None:
+    output = vault / "index.md"
+    assert write_index(Cache(vault_root=vault, use_cache=True), output)
+    for current, _, _ in os.walk(vault):
+        os.utime(current, ns=(0, 0))
+    assert write_index(Cache(vault_root=vault, use_cache=True), output, dry_run=True) is False
+
+    (vault / "foo" / "new note.md").write_text("")
+    with mock.patch("os.scandir", wraps=os.scandir) as scandir:
+        assert write_index(Cache(vault_root=vault, use_cache=True), output)
+    # only the directory with the new note is listed again, the unchanged index was never written
+    assert [call.args[0] for call in scandir.call_args_list] == [vault / "foo"]
+    assert output.read_text() == "".join(iter_rendered_index(vault, Path("index.md")))
@@ -1,5 +1,52 @@
+import subprocess
+import sys
+
 import obsidian_github_formatter
 
+# far above what importing the hook takes, so only a heavy dependency imported eagerly trips it
+_IMPORT_BUDGET_SECONDS = 1.0
+
 
 def test_version() -> None:
     assert obsidian_github_formatter.__version__
+
+
+def test_hook_defers_heavy_imports() -> None:
+    # a fresh interpreter, the test session has imported everything already
+    deferred = (
+        "colorama",
+        "concurrent.futures.process",
+        "configparser",
+        "dacite",
+        "difflib",
+        "obsidian_github_formatter.server",
+        "shutil",
+        "socketserver",
+        "yaml",
+    )
+    completed = subprocess.run(
+        [
+            sys.executable,
+            "-c",
+            "import sys, obsidian_github_formatter.repair_wikilinks_hook; print(*sorted(sys.modules))",
+        ],
+        check=True,
+        capture_output=True,
+        text=True,
+    )
+    assert set(completed.stdout.split()).isdisjoint(deferred)
+
+
+def test_hook_import_time() -> None:
+    completed = subprocess.run(
+        [
+            sys.executable,
+            "-c",
+            "import time; started = time.perf_counter(); import obsidian_github_formatter.repair_wikilinks_hook; "
+            "print(time.perf_counter() - started)",
+        ],
+        check=True,
+        capture_output=True,
+        text=True,
+    )
+    assert float(completed.stdout) < _IMPORT_BUDGET_SECONDS
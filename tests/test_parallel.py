@@ -0,0 +1,57 @@
+from pathlib import Path
+from unittest import mock
+
+import pytest
+
+from obsidian_github_formatter.cache import Cache
+from obsidian_github_formatter.files import expand_dir
+from obsidian_github_formatter.links import (
+    LinksErrors,
+    ResolutionStats,
+    get_link_rewriter,
+    write_autogenerated_documents,
+)
+from obsidian_github_formatter.parallel import (
+    deserialize_error,
+    merge_result,
+    process_captured,
+    process_files,
+    serialize_error,
+)
+
+
+def test_error_serialization() -> None:
+    error = LinksErrors.DeadLink(target="foo", title=None, file="bar.md")
+    restored = deserialize_error(serialize_error(error))
+    assert isinstance(restored, LinksErrors.DeadLink)
+    assert restored.to_dict() == error.to_dict()
+
+
+def test_merge_result_initializes_console(vault: Path, capsys: pytest.CaptureFixture) -> None:
+    cache = Cache(vault_root=vault, dry_run=True, make_backups=False)
+    result = process_captured([vault / "foo" / "foo.md"], cache)
+    assert result.output
+    events = []
+    with mock.patch("obsidian_github_formatter.parallel.init_console", lambda: events.append("init")), mock.patch(
+        "sys.stdout.write", lambda text: events.append(text)
+    ):
+        merge_result(result, Cache(vault_root=vault, dry_run=True, make_backups=False), ResolutionStats())
+    assert events == ["init", result.output]
+
+
+def _run(vault: Path, jobs: int, capsys: pytest.CaptureFixture) -> tuple:
+    cache = Cache(vault_root=vault, dry_run=True, make_backups=False)
+    filepaths = list(expand_dir(vault)) * 3
+    process_files(filepaths, cache, jobs=jobs)
+    write_autogenerated_documents(cache, cache.get_value(get_link_rewriter).take_autogenerated())
+    errors = [e.to_dict() for e in cache.get_value("get_errors")]
+    return capsys.readouterr().out, errors, cache.get_value("get_notifications")
+
+
+def test_parallel_matches_serial(vault: Path, capsys: pytest.CaptureFixture) -> None:
+    serial = _run(vault, 1, capsys)
+    parallel = _run(vault, 2, capsys)
+    assert serial[1]
+    # every job asks for the documents, each one is reported once
+    assert serial[2] and len(set(serial[2])) == len(serial[2])
+    assert parallel == serial
@@ -1,11 +1,21 @@
+import dataclasses
+import typing as t
 from pathlib import Path
 from unittest import mock
 
+import pytest
+
 from obsidian_github_formatter.cache import Cache
+from obsidian_github_formatter.config import Config
+from obsidian_github_formatter.files import save_file
 from obsidian_github_formatter.links import (
+    LinkRewriter,
+    get_link_rewriter,
+    iter_link_targets,
     process_file,
     repair_links,
     substitute_wikilink_format,
+    write_autogenerated_documents,
 )
 
 
@@ -41,6 +51,104 @@ class TestRepairLinks:
         assert repair_links("foo ![[bar.jpg|Title]] baz", cache) == "foo ![Title](/foo/bar.jpg) baz"
 
 
+class TestLinkRewriter:
+    def test_rewrite(self, cache: Cache) -> None:
+        rewriter: LinkRewriter = get_link_rewriter(cache)
+        text, errors = rewriter.rewrite("[[bar_file]] [[bar.jpg|Title]] [[bar_file]]", Path("foo.md"))
+        assert text == "[bar_file](/bar/bar_file.md) [Title](/foo/bar.jpg) [bar_file](/bar/bar_file.md)"
+        assert errors == []
+
+    def test_rewrite_dead_link(self, cache: Cache) -> None:
+        rewriter = dataclasses.replace(get_link_rewriter(cache), config=Config())
+        text, errors = rewriter.rewrite("[[quax|Title]]", Path("foo.md"))
+        assert text == "[[quax|Title|Title ❌]]"
+        assert [e.to_dict() for e in errors] == [
+            {
+                "code": "DeadLink",
+                "catalog": "LinksErrors",
+                "kwargs": {"target": "quax", "title": "Title", "file": "foo.md"},
+            }
+        ]
+        assert cache.get_value("get_errors") == []
+
+    def test_rewrite_ambiguous_link(self, cache: Cache) -> None:
+        text, errors = get_link_rewriter(cache).rewrite("[[foo]]", Path("bar.md"))
+        assert text == "[[foo|foo 🟡]]"
+        assert [e.to_dict()["kwargs"] for e in errors] == [
+            {"target": "foo", "target_files": ["foo/foo.md", "bar/foo.md"], "file": "bar.md"}
+        ]
+
+    def test_resolution_cache(self, cache: Cache) -> None:
+        rewriter = dataclasses.replace(get_link_rewriter(cache), config=Config(), resolution_cache_size=2)
+        text, errors = rewriter.rewrite("[[bar_file]] [[quax]] [[bar_file]] [[quax]] [[foo.md]] [[bar_file]]")
+        assert text.split(" ")[:2] == ["[bar_file](/bar/bar_file.md)", "[[quax|quax"]
+        assert [e.code for e in errors] == ["DeadLink", "DeadLink", "AmbiguousLink"]
+        assert (rewriter.stats.hits, rewriter.stats.misses) == (2, 4)
+        assert rewriter.stats.hit_rate == pytest.approx(1 / 3)
+        assert list(rewriter._resolutions) == ["foo.md", "bar_file"]
+
+    def test_rewrite_skips_code(self, cache: Cache) -> None:
+        rewriter = dataclasses.replace(get_link_rewriter(cache), config=Config())
+        text, errors = rewriter.rewrite(_CODE_NOTE, Path("foo.md"))
+        expected = _CODE_NOTE.replace("[[bar_file]]", "[bar_file](/bar/bar_file.md)")
+        assert text == expected.replace("[[quax]]", "[[quax|quax ❌]]")
+        assert text.count("[bar_file](/bar/bar_file.md)") == 4
+        assert [e.to_dict()["kwargs"]["target"] for e in errors] == ["quax"]
+        assert list(iter_link_targets(_CODE_NOTE)) == ["bar_file", "bar_file", "quax", "bar_file", "bar_file"]
+
+    def test_unclosed_fence(self, cache: Cache) -> None:
+        rewriter = get_link_rewriter(cache)
+        assert rewriter.rewrite("[[bar_file]]\n~~~\n[[bar_file]]\n```\n")[0] == (
+            "[bar_file](/bar/bar_file.md)\n~~~\n[[bar_file]]\n```\n"
+        )
+        assert rewriter.rewrite("---\n[[bar_file]]\n")[0] == "---\n[bar_file](/bar/bar_file.md)\n"
+
+    @pytest.mark.parametrize(
+        "note, targets",
+        [
+            ("1. ```sh\n   run [[a]]\n   ```\n2. then [[b]]\n\nlater [[c]]", ["b", "c"]),
+            ("- a\n  - b\n    ```\n    [[a]]\n    ```\n  [[b]]\n", ["b"]),
+            ("1. a\n   - b\n\n     ~~~\n     [[a]]\n\n     ~~~\n[[b]]", ["b"]),
+            ("- ```\n  [[a]]\n[[b]]", ["b"]),
+            ("> [!note]\n> ```\n> [[a]]\n> ```\n> [[b]]\n[[c]]", ["b", "c"]),
+            ("> ```\n> [[a]]\n\n[[b]]", ["b"]),
+            ("> - ```\n>   [[a]]\n>   ```\n> [[b]]", ["b"]),
+            ("~~~ js `x`\n[[a]]\n~~~\n[[b]]", ["b"]),
+            ("``` js `x`\n[[a]]\n[[b]]", ["a", "b"]),
+        ],
+    )
+    def test_fence_in_container(self, note: str, targets: t.List[str], cache: Cache) -> None:
+        rewriter = dataclasses.replace(get_link_rewriter(cache), config=Config())
+        assert list(iter_link_targets(note)) == targets
+        text, errors = rewriter.rewrite(note, Path("foo.md"))
+        assert [e.to_dict()["kwargs"]["target"] for e in errors] == targets
+        assert text.count("❌") == len(targets)
+
+
+_CODE_NOTE = "\n".join(
+    (
+        "---",
+        "aliases: [[[missing]]]",
+        "---",
+        "[[bar_file]] `[[missing]]` ``a ` [[missing]]`` [[bar_file]]",
+        "````python",
+        "[[missing]]",
+        "```",
+        "[[missing]]",
+        "`````",
+        "  ~~~",
+        "```[[missing]]```",
+        "  ~~~~ ",
+        "```[[missing]]``` ` [[quax]]",
+        "---",
+        "[[bar_file]]",
+        "---",
+        "    ```",
+        "[[bar_file]]",
+    )
+)
+
+
 class TestProcessFile:
     @mock.patch("obsidian_github_formatter.links.read_file")
     @mock.patch("obsidian_github_formatter.links._print")
@@ -92,3 +200,118 @@ class TestProcessFile:
             ),
             make_backups=False,
         )
+
+    def test_autogenerate_once(self, vault: Path) -> None:
+        cache = Cache(vault_root=vault, dry_run=False, make_backups=False)
+        notes = [vault / "foo" / f"note {i}.md" for i in range(3)]
+        for note in notes:
+            note.write_text("[[new doc|New]] [[new doc]]")
+        with mock.patch("obsidian_github_formatter.links.save_file", wraps=save_file) as save:
+            for note in notes:
+                process_file(note, cache)
+            assert not (vault / "bar" / "new doc.md").exists()
+            rewriter: LinkRewriter = cache.get_value(get_link_rewriter)
+            written = write_autogenerated_documents(cache, rewriter.take_autogenerated())
+        assert written == [vault / "bar" / "new doc.md"]
+        assert [call.args[0] for call in save.call_args_list] == [*notes, vault / "bar" / "new doc.md"]
+        assert notes[2].read_text() == "[New](</bar/new doc.md>) [new doc](</bar/new doc.md>)"
+        assert cache.get_value("get_errors") == []
+        assert cache.get_value("get_notifications") == [f"File autogenerated: {vault / 'bar' / 'new doc.md'}"]
+        assert (rewriter.stats.hits, rewriter.stats.misses) == (3, 3)
+        assert cache.get_value("build_file_map")["new doc"] == [Path("bar/new doc.md")]
+
+    def test_autogenerate_dry_run(self, vault: Path) -> None:
+        cache = Cache(vault_root=vault, dry_run=True, make_backups=False)
+        note = vault / "foo" / "note.md"
+        note.write_text("[[new doc]] [[new doc.md]]")
+        with mock.patch("obsidian_github_formatter.links._print"):
+            process_file(note, cache)
+        rewriter: LinkRewriter = cache.get_value(get_link_rewriter)
+        paths = rewriter.take_autogenerated()
+        assert paths == [Path("bar/new doc.md")]
+        assert write_autogenerated_documents(cache, paths) == []
+        assert not (vault / "bar" / "new doc.md").exists()
+        assert cache.get_value("get_notifications") == [f"File would be autogenerated: {vault / 'bar' / 'new doc.md'}"]
+        assert "new doc" not in cache.get_value("build_file_map")
+        assert not rewriter._autogenerated_map
+
+
+_LARGE_NOTE = "\n".join(
+    (
+        "FOO BAR",
+        "foo [[OTHER FOO]] bar! [[bar_file|Bar [x]]] [",
+        "",
+        "[[quax]] [[bar.jpg]][[bar.jpg|[[]]",
+        *(f"line {i}" for i in range(12)),
+        "[[foo]] [[bar_file",
+        "]] [[OTHER FOO|the end]]",
+    )
+)
+
+_CONTAINER_NOTE = "\n".join(
+    (
+        "1. ```sh",
+        "   run [[missing]]",
+        "   ```",
+        "2. then [[bar_file]]",
+        "   - nested",
+        "     ~~~ `info`",
+        "     [[missing]]",
+        "",
+        "     ~~~",
+        "> [!note]",
+        "> ```",
+        "> [[missing]]",
+        "> ```",
+        "> [[bar_file]]",
+        "> ```",
+        "> [[missing]]",
+        "[[bar_file]]",
+    )
+)
+
+
+class TestStreaming:
+    @pytest.mark.parametrize("note", [_LARGE_NOTE, _CODE_NOTE, _CONTAINER_NOTE])
+    @pytest.mark.parametrize("chunk_size", [1, 2, 3, 7, 1000])
+    def test_rewrite_segments(self, note: str, chunk_size: int, cache: Cache) -> None:
+        rewriter = dataclasses.replace(get_link_rewriter(cache), config=Config())
+        expected_text, expected_errors = rewriter.rewrite(note, Path("foo.md"))
+        chunks = [note[i : i + chunk_size] for i in range(0, len(note), chunk_size)]
+        errors: list = []
+
+        segments = list(rewriter.rewrite_segments(chunks, errors, Path("foo.md")))
+        assert "".join(original for original, _ in segments) == note
+        assert "".join(formatted for _, formatted in segments) == expected_text
+        assert [e.to_dict() for e in errors] == [e.to_dict() for e in expected_errors]
+
+    @pytest.mark.parametrize("opening", ["```\n", "> ```\n", "---\n"])
+    def test_rewrite_segments_unclosed(self, opening: str, cache: Cache) -> None:
+        # neither an unclosed fence nor frontmatter keeps the rest of the note to a single segment
+        rewriter = dataclasses.replace(get_link_rewriter(cache), config=Config())
+        note = opening + "> [[bar_file]]\n" * 10_000
+        chunks = [note[i : i + 1000] for i in range(0, len(note), 1000)]
+
+        segments = list(rewriter.rewrite_segments(chunks, [], Path("foo.md")))
+        assert "".join(formatted for _, formatted in segments) == rewriter.rewrite(note)[0]
+        assert max(len(original) for original, _ in segments) < 80_000
+
+    @pytest.mark.parametrize("dry_run", [True, False])
+    def test_process_file(self, dry_run: bool, vault: Path, cache: Cache) -> None:
+        def run() -> t.Tuple[str, str, list]:
+            path.write_text(_LARGE_NOTE)
+            cache.get_value("get_errors").clear()
+            with mock.patch("obsidian_github_formatter.links._print") as _print:
+                process_file(path, cache)
+            printed = "\n".join(call[0][0] for call in _print.call_args_list)
+            return path.read_text(), printed, [e.to_dict() for e in cache.get_value("get_errors")]
+
+        path = vault / "note.md"
+        cache.add_values(dry_run=dry_run, get_config=Config())
+        in_memory = run()
+        cache.add_values(streaming_threshold=10, stream_chunk_size=5)
+        streamed = run()
+
+        assert streamed == in_memory
+        assert (streamed[0] == _LARGE_NOTE) is dry_run
+        assert [p.name for p in vault.iterdir() if p.name.endswith(".tmp")] == []
@@ -1,6 +1,9 @@
+from pathlib import Path
+
 from obsidian_github_formatter.cache import Cache
 from obsidian_github_formatter.repository import (
     Submodule,
+    SubmoduleTable,
     get_repo_root,
     get_submodules,
 )
@@ -15,17 +18,33 @@ def test_get_repo_root(cache: Cache) -> None:
 
 def test_get_submodules_empty(cache: Cache) -> None:
     cache.add_values(get_repo_root=_test_stub_path)
-    assert get_submodules(cache) == []
+    assert list(get_submodules(cache)) == []
 
 
 def test_get_submodules(cache: Cache) -> None:
     cache.add_values(get_repo_roo=_test_stub_path / "..")
     submodule_path = _test_stub_path / "submodule"
 
-    assert get_submodules(cache) == [
+    assert list(get_submodules(cache)) == [
         Submodule(
             name="submodule",
             path=submodule_path,
             repo_url="git@github.com:lhaze/obsidian-github-formatter-test-submodule.git",
         )
     ]
+
+
+def test_submodule_table() -> None:
+    vault_root = Path("/repo/vault")
+    outer = Submodule(name="outer", path=vault_root / "outer", repo_url="git@github.com:foo/outer.git")
+    inner = Submodule(
+        name="inner", path=vault_root / "outer/inner", repo_url="git@github.com:foo/inner.git", ref="main"
+    )
+    elsewhere = Submodule(name="elsewhere", path=Path("/repo/elsewhere"), repo_url="git@github.com:foo/else.git")
+    table = SubmoduleTable([outer, inner, elsewhere], vault_root)
+
+    assert len(table) == 3
+    assert table.substitute(Path("outer/foo bar.png")) == "https://github.com/foo/outer/raw/master/foo bar.png"
+    assert table.substitute(Path("outer/inner/a/b.md")) == "https://github.com/foo/inner/raw/main/a/b.md"
+    assert table.substitute(Path("outer")) is None
+    assert table.substitute(Path("other/outer/b.md")) is None
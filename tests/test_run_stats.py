@@ -0,0 +1,52 @@
+from pathlib import Path
+from unittest import mock
+
+from obsidian_github_formatter.cache import Cache
+from obsidian_github_formatter.config import Config
+from obsidian_github_formatter.links import process_file
+from obsidian_github_formatter.run_stats import (
+    RunStats,
+    get_run_stats,
+)
+
+
+def test_phases_and_files() -> None:
+    stats = RunStats()
+    with stats.timing_file(Path("a.md")), stats.phase("read"):
+        pass
+    with stats.timing_file(Path("b.md")), stats.phase("read"):
+        pass
+    other = RunStats(phases={"read": 1.0, "save": 2.0}, file_times={"c.md": 3.0}, skipped_files=1)
+    stats.add(other)
+
+    assert stats.phases["read"] > 1.0
+    assert stats.phases["save"] == 2.0
+    assert stats.slowest_files(2)[0] == ("c.md", 3.0)
+    assert len(stats.slowest_files(2)) == 2
+    assert stats.skipped_files == 1
+
+
+def test_process_file_phases(vault: Path) -> None:
+    note = vault / "note.md"
+    note.write_text("[[bar_file]]")
+    cache = Cache(vault_root=vault, dry_run=False, make_backups=False, get_config=Config())
+    process_file(note, cache)
+
+    stats: RunStats = cache.get_value(get_run_stats)
+    assert set(stats.phases) == {"prescan", "read", "rewrite", "save"}
+    assert list(stats.file_times) == [str(note)]
+    assert set(cache.computation_times) >= {"build_file_map", "get_submodules", "get_link_rewriter"}
+
+
+def test_linkless_note_not_decoded(vault: Path) -> None:
+    (vault / "empty.md").write_text("")
+    (vault / "plain.md").write_text("[single] brackets only")
+    cache = Cache(vault_root=vault, dry_run=False, make_backups=False, get_config=Config())
+    with mock.patch("obsidian_github_formatter.links.read_file") as read_file:
+        process_file(vault / "empty.md", cache)
+        process_file(vault / "plain.md", cache)
+    read_file.assert_not_called()
+
+    stats: RunStats = cache.get_value(get_run_stats)
+    assert stats.linkless_files == 2
+    assert set(stats.phases) == {"prescan"}
@@ -0,0 +1,147 @@
+import os
+import socket
+import threading
+from pathlib import Path
+from unittest import mock
+
+import pytest
+
+from obsidian_github_formatter.cache import Cache
+from obsidian_github_formatter.config import Config
+from obsidian_github_formatter.links import write_autogenerated_documents
+from obsidian_github_formatter.parallel import process_captured
+from obsidian_github_formatter.server import (
+    ServerRequest,
+    VaultServer,
+    _UnixServer,
+    forward_to_server,
+    receive_message,
+    send_message,
+)
+from obsidian_github_formatter.storage import get_socket_path
+
+
+def test_messages() -> None:
+    left, right = socket.socketpair()
+    with left, right:
+        send_message(left, {"foo": "x" * 100_000})
+        assert receive_message(right) == {"foo": "x" * 100_000}
+        left.close()
+        with pytest.raises(ConnectionError):
+            receive_message(right)
+
+
+def test_handle(vault: Path) -> None:
+    cache = Cache(vault_root=vault, dry_run=True, make_backups=False, use_cache=True, get_config=Config())
+    server = VaultServer(cache)
+    (vault / "bar" / "quax.md").write_text("[[bar_file]]")
+    note = vault / "foo" / "foo.md"
+
+    result = server.handle(ServerRequest(Path.cwd(), vault, [note], dry_run=True, make_backups=False))
+    assert result is not None
+    assert "would be modified" in result.output
+    assert "+- [bar_file](/bar/quax.md)" in result.output
+    assert [e[2] for e in result.errors] == ["DeadLink", "DeadLink", "AmbiguousLink"]
+    assert server.handle(ServerRequest(Path.cwd(), vault.parent, [note], dry_run=True, make_backups=False)) is None
+
+
+def test_handle_reports_config_errors(vault: Path) -> None:
+    (vault / ".ogf-config.yaml").write_text("links: [")
+    server = VaultServer(Cache(vault_root=vault, dry_run=True, make_backups=False, use_cache=True))
+    note = vault / "bar" / "bar_file.md"
+    for _ in range(2):
+        result = server.handle(ServerRequest(Path.cwd(), vault, [note], dry_run=True, make_backups=False))
+        assert result is not None
+        assert [e[2] for e in result.errors] == ["ConfigFileSyntaxError"]
+
+
+def test_handle_lists_changed_directories_only(vault: Path) -> None:
+    # the snapshots written by the server mustn't touch the vault root
+    (vault / ".ogf-cache").mkdir()
+    for current, _, _ in os.walk(vault):
+        os.utime(current, ns=(0, 0))
+    cache = Cache(vault_root=vault, dry_run=True, make_backups=False, use_cache=True, get_config=Config())
+    server = VaultServer(cache)
+    (vault / "bar" / "quax.md").write_text("")
+    note = vault / "foo" / "foo.md"
+    with mock.patch("os.scandir", wraps=os.scandir) as scandir:
+        result = server.handle(ServerRequest(Path.cwd(), vault, [note], dry_run=True, make_backups=False))
+    assert [call.args[0] for call in scandir.call_args_list] == [vault / "bar"]
+    assert result is not None
+    assert server.watcher.file_map["quax"] == [Path("bar/quax.md")]
+
+
+def test_handle_autogenerates_after_dry_run(vault: Path) -> None:
+    server = VaultServer(Cache(vault_root=vault, dry_run=False, make_backups=False, use_cache=True))
+    note = vault / "foo" / "note.md"
+    note.write_text("[[Missing Doc]]")
+    document = vault / "bar" / "Missing Doc.md"
+
+    result = server.handle(ServerRequest(Path.cwd(), vault, [note], dry_run=True, make_backups=False))
+    assert result is not None
+    assert result.notifications == [f"File would be autogenerated: {document}"]
+    assert "Missing Doc" not in server.watcher.file_map
+
+    result = server.handle(ServerRequest(Path.cwd(), vault, [note], dry_run=False, make_backups=False))
+    assert result is not None
+    assert result.notifications == [f"File autogenerated: {document}"]
+    assert document.exists()
+    assert note.read_text() == "[Missing Doc](</bar/Missing Doc.md>)"
+    assert server.watcher.file_map["Missing Doc"] == [Path("bar/Missing Doc.md")]
+
+
+def test_handle_reads_changed_config(vault: Path) -> None:
+    server = VaultServer(Cache(vault_root=vault, dry_run=False, make_backups=False, use_cache=True))
+    note = vault / "foo" / "note.md"
+    note.write_text("[[Brand New]]")
+    server.handle(ServerRequest(Path.cwd(), vault, [note], dry_run=False, make_backups=False))
+    assert (vault / "bar" / "Brand New.md").exists()
+
+    (vault / ".ogf-config.yaml").write_text("links: [")
+    note.write_text("[[Other New]]")
+    result = server.handle(ServerRequest(Path.cwd(), vault, [note], dry_run=False, make_backups=False))
+    assert result is not None
+    assert [e[2] for e in result.errors] == ["ConfigFileSyntaxError", "DeadLink"]
+
+    (vault / ".ogf-config.yaml").write_text("links:\n  autogenerate_dir: foo\n")
+    result = server.handle(ServerRequest(Path.cwd(), vault, [note], dry_run=False, make_backups=False))
+    assert result is not None
+    assert result.errors == []
+    assert (vault / "foo" / "Other New.md").exists()
+    assert note.read_text() == "[Other New](</foo/Other New.md>)"
+
+
+def test_handle_reports_paths_as_given(vault: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    server = VaultServer(Cache(vault_root=vault, dry_run=True, make_backups=False, use_cache=True))
+    monkeypatch.chdir(vault.parent)
+    notes = [Path("showcase/foo/foo.md"), Path("showcase/bar/bar_file.md")]
+    cache = Cache(vault_root=Path("showcase"), dry_run=True, make_backups=False)
+    expected = process_captured(notes, cache)
+    write_autogenerated_documents(cache, expected.autogenerated)
+
+    result = server.handle(ServerRequest(Path.cwd(), Path("showcase"), notes, dry_run=True, make_backups=False))
+    assert result is not None
+    assert "File 'showcase/foo/foo.md' would be modified" in result.output
+    assert result.output == expected.output
+    assert result.errors == expected.errors
+    assert result.notifications == cache.get_value("get_notifications")
+    assert {e[3]["file"] for e in result.errors} == {"showcase/foo/foo.md"}
+
+
+def test_forward_to_server(vault: Path) -> None:
+    cache = Cache(vault_root=vault, dry_run=True, make_backups=False, use_cache=True)
+    assert forward_to_server(cache, [vault / "foo" / "foo.md"]) is None
+
+    socket_path = get_socket_path(cache)
+    socket_path.parent.mkdir()
+    with _UnixServer(socket_path, VaultServer(cache)) as server:
+        thread = threading.Thread(target=server.serve_forever)
+        thread.start()
+        try:
+            result = forward_to_server(cache, [vault / "foo" / "foo.md"])
+        finally:
+            server.shutdown()
+            thread.join()
+    assert result is not None
+    assert "would be modified" in result.output
+    assert forward_to_server(cache, [vault / "foo" / "foo.md"]) is None
@@ -0,0 +1,57 @@
+import os
+import pickle
+import typing as t
+from pathlib import Path
+
+from obsidian_github_formatter.cache import Cache
+from obsidian_github_formatter.storage import (
+    CACHE_DIR_NAME,
+    dump_snapshot,
+    get_cache_dir,
+    load_snapshot,
+)
+
+
+def test_cache_dir_disabled(cache: Cache) -> None:
+    assert get_cache_dir(cache) is None
+    dump_snapshot(cache, "foo.bin", {"foo": 1})
+    assert load_snapshot(cache, "foo.bin") is None
+
+
+def test_snapshot_roundtrip(vault: Path) -> None:
+    cache = Cache(vault_root=vault, use_cache=True)
+    assert load_snapshot(cache, "foo.bin") is None
+    dump_snapshot(cache, "foo.bin", {"foo": 1})
+    assert load_snapshot(Cache(vault_root=vault, use_cache=True), "foo.bin") == {"foo": 1}
+    assert sorted(p.name for p in (vault / CACHE_DIR_NAME).iterdir()) == [".gitignore", "foo.bin"]
+
+
+def test_snapshot_corrupted(vault: Path) -> None:
+    cache = Cache(vault_root=vault, use_cache=True)
+    dump_snapshot(cache, "foo.bin", {"foo": 1})
+    (vault / CACHE_DIR_NAME / "foo.bin").write_bytes(b"garbage")
+    assert load_snapshot(cache, "foo.bin") is None
+
+
+class _Payload:
+    def __init__(self, path: Path) -> None:
+        self.path = path
+
+    def __reduce__(self) -> t.Tuple[t.Any, ...]:
+        return os.mkdir, (str(self.path),)
+
+
+def test_snapshot_runs_no_code(vault: Path) -> None:
+    # a snapshot committed to the vault is only ever read as plain data
+    cache = Cache(vault_root=vault, use_cache=True)
+    dump_snapshot(cache, "foo.bin", {"foo": 1})
+    (vault / CACHE_DIR_NAME / "foo.bin").write_bytes(pickle.dumps((3, _Payload(vault / "pwned"))))
+    assert load_snapshot(cache, "foo.bin") is None
+    assert not (vault / "pwned").exists()
+
+
+def test_snapshot_decode(vault: Path) -> None:
+    cache = Cache(vault_root=vault, use_cache=True)
+    dump_snapshot(cache, "foo.bin", ("a", [1, 2]))
+    assert load_snapshot(cache, "foo.bin", lambda data: (Path(data[0]), tuple(data[1]))) == (Path("a"), (1, 2))
+    assert load_snapshot(cache, "foo.bin", lambda data: data["missing"]) is None
@@ -0,0 +1,85 @@
+import os
+from pathlib import Path
+from unittest import mock
+
+from obsidian_github_formatter.cache import Cache
+from obsidian_github_formatter.config import Config
+from obsidian_github_formatter.watch import (
+    VaultWatcher,
+    scan_file_states,
+)
+
+
+class FakeClock:
+    def __init__(self) -> None:
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def _watcher(vault: Path, clock: FakeClock) -> VaultWatcher:
+    cache = Cache(vault_root=vault, dry_run=False, make_backups=False, get_config=Config())
+    return VaultWatcher(cache, debounce=1.0, clock=clock)
+
+
+def test_scan_file_states(vault: Path) -> None:
+    states = scan_file_states(vault)
+    assert Path("bar/bar baz/baz.jpg") in states
+    assert Path(".ogf-config.yaml") not in states
+
+
+def test_debounced_processing(vault: Path) -> None:
+    clock = FakeClock()
+    watcher = _watcher(vault, clock)
+    (vault / "bar" / "new.md").write_text("[[bar_file]]")
+    assert watcher.poll() == []
+
+    clock.now = 0.5
+    (vault / "bar" / "new.md").write_text("[[bar_file]] [[bar_file]]")
+    assert watcher.poll() == []
+
+    clock.now = 1.6
+    assert watcher.poll() == [vault / "bar" / "new.md"]
+    assert (vault / "bar" / "new.md").read_text() == "[bar_file](/bar/bar_file.md) [bar_file](/bar/bar_file.md)"
+    assert watcher.poll() == []
+
+
+def test_file_map_updated(vault: Path) -> None:
+    clock = FakeClock()
+    watcher = _watcher(vault, clock)
+    assert watcher.rewriter.rewrite("[[bar_file]]")[0] == "[bar_file](/bar/bar_file.md)"
+
+    (vault / "bar" / "bar_file.md").rename(vault / "foo" / "renamed.md")
+    (vault / "bar" / "new.md").write_text("[[renamed]] [[bar_file]]")
+    clock.now = 2.0
+    assert watcher.poll() == []
+    clock.now = 3.0
+    assert watcher.poll() == [vault / "bar" / "new.md", vault / "foo" / "renamed.md"]
+    assert "bar_file" not in watcher.file_map
+    assert watcher.file_map["renamed.md"] == [Path("foo/renamed.md")]
+    assert (vault / "bar" / "new.md").read_text() == "[renamed](/foo/renamed.md) [[bar_file|bar_file ❌]]"
+
+
+def test_unchanged_directories_not_scanned(vault: Path) -> None:
+    clock = FakeClock()
+    for current, _, _ in os.walk(vault):
+        os.utime(current, ns=(0, 0))
+    watcher = _watcher(vault, clock)
+    (vault / "bar" / "new.md").write_text("[[bar_file]]")
+    with mock.patch("os.scandir", wraps=os.scandir) as scandir:
+        assert watcher.sync() == {Path("bar/new.md")}
+    assert [call.args[0] for call in scandir.call_args_list] == [vault / "bar"]
+    assert watcher.file_map["new"] == [Path("bar/new.md")]
+
+
+def test_modified_in_place_noticed_by_full_scan(vault: Path) -> None:
+    clock = FakeClock()
+    for current, _, _ in os.walk(vault):
+        os.utime(current, ns=(0, 0))
+    watcher = _watcher(vault, clock)
+    note = vault / "bar" / "bar_file.md"
+    note.write_text("[[foo]] changed")
+    os.utime(vault / "bar", ns=(0, 0))
+    assert watcher.sync() == set()
+    assert watcher.sync(full=True) == {Path("bar/bar_file.md")}